@@ -0,0 +1,346 @@
+
+# Host side benchmarks for the si5351 driver, run with: python3 bench.py
+#
+# Use --json FILE (or - for stdout) to also save the results as JSON
+# for tracking performance across releases.
+
+import random
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from si5351 import bestFraction, planFrequencies, SI5351_I2C
+from si5351 import SI5351_MULTISYNTH_C_MAX, SI5351_CLKOUT_MIN_FREQ
+
+
+class NullI2C:
+    # a bus that accepts every write and holds no state
+    def writeto_mem(self, address, register, data):
+        pass
+
+
+def halving(num, denom):
+    # the fraction fitting set_freq used before bestFraction
+    while denom > SI5351_MULTISYNTH_C_MAX:
+       num //= 2
+       denom //= 2
+    return num, denom
+
+
+def bench_fraction(fvco=800000000, count=20000, seed=1):
+    # Compare the output frequency error and time per call of the
+    # multisynth fraction fitters for random 1MHz..100MHz outputs.
+    rnd = random.Random(seed)
+    freqs = [rnd.randrange(1000000, 100000000) for i in range(count)]
+    rows = []
+    for name, fit in (("halving", halving), ("bestFraction", bestFraction)):
+        start = time.perf_counter()
+        for freq in freqs:
+            fit(fvco % freq, freq)
+        elapsed = time.perf_counter() - start
+        worst = total = 0
+        for freq in freqs:
+            div = fvco // freq
+            num, denom = fit(fvco % freq, freq)
+            err = abs(fvco * denom / (div * denom + num) - freq)
+            worst = max(worst, err)
+            total += err
+        rows.append({"fitter": name, "worst_hz": worst, "mean_hz": total / count,
+                     "us_per_call": elapsed / count * 1e6})
+    return rows
+
+
+def bench_planner(count=200, seed=1):
+    # Time planFrequencies for random configurations of 1 to 6 outputs
+    # between 10kHz and 100MHz and count the integer mode outputs.
+    rnd = random.Random(seed)
+    rows = []
+    for n in range(1, 7):
+        configs = [[rnd.randrange(10000, 100000000) for i in range(n)]
+                   for j in range(count)]
+        start = time.perf_counter()
+        plans = [planFrequencies(freqs) for freqs in configs]
+        elapsed = time.perf_counter() - start
+        integer = sum(o[2] == 0 for vco, outputs in plans for o in outputs)
+        rows.append({"outputs": n, "ms_per_plan": elapsed / count * 1e3,
+                     "integer_mode": integer / (n * count)})
+    return rows
+
+
+def bands():
+    # the R divider bands of set_freq, then the multisynth range split
+    # into decades up to 160MHz
+    for k in range(7):
+        lo = SI5351_CLKOUT_MIN_FREQ << k
+        yield "R_DIV_{}".format(128 >> k), lo, lo * 2
+    yield "R_DIV_1", SI5351_CLKOUT_MIN_FREQ << 7, 10000000
+    yield "10MHz", 10000000, 100000000
+    yield "100MHz", 100000000, 160000000
+
+
+def bench_tuning(count=2000, seed=1, busFreq=100000):
+    # Sweep set_freq over every band on the simulated bus with an
+    # 800MHz VCO.  Reports cold (no tuning cache) and warm calls/sec,
+    # bus traffic per call, the peak memory of a sweep, the worst
+    # frequency error decoded from the register image and the share of
+    # frequencies needing a multisynth divider outside 8..900.
+    from si5351sim import SimI2C
+    rnd = random.Random(seed)
+    rows = []
+    for name, lo, hi in bands():
+        freqs = [rnd.randrange(lo, hi) for i in range(count)]
+
+        def sweep(cacheSize, check=False, bus=None):
+            bus = bus or SimI2C(freq=busFreq)
+            si = SI5351_I2C(bus, cacheSize=cacheSize)
+            si.setupPLL(si.PLL_A, 32)
+            if isinstance(bus, SimI2C): bus.clear()
+            worst_hz = worst_ppm = invalid = 0
+            start = time.perf_counter()
+            for freq in freqs:
+                si.set_freq(0, si.PLL_A, freq)
+                if check:
+                    err = abs(float(bus.frequency(0)) - freq)
+                    worst_hz = max(worst_hz, err)
+                    worst_ppm = max(worst_ppm, err / freq * 1e6)
+                    ms = bus.divider(42)
+                    invalid += not (8 <= ms <= 900 or ms in (4, 6))
+            return si, bus, time.perf_counter() - start, worst_hz, worst_ppm, invalid
+
+        si, bus, cold, worst_hz, worst_ppm, invalid = sweep(0, True)
+        si, bus, cold = sweep(0)[:3]
+        traffic = bus.summary()
+        si = sweep(count)[0]
+        start = time.perf_counter()
+        for freq in freqs:
+            si.set_freq(0, si.PLL_A, freq)
+        warm = time.perf_counter() - start
+
+        # peak memory of the driver alone, without the simulator's log
+        peak = 0
+        if tracemalloc:
+            tracemalloc.start()
+            sweep(0, bus=NullI2C())
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        rows.append({
+            "band": name,
+            "cold_calls_per_s": count / cold,
+            "warm_calls_per_s": count / warm,
+            "transactions": traffic["transactions"] / count,
+            "bytes": traffic["bytes_written"] / count,
+            "bus_us": traffic["us"] / count,
+            "peak_bytes": peak,
+            "worst_hz": worst_hz,
+            "worst_ppm": worst_ppm,
+            "out_of_range": invalid / count,
+        })
+    return rows
+
+
+def bench_calls(count=200, busFreq=100000):
+    # Time and bus cost per call of the setup methods on the simulated bus.
+    from si5351sim import SimI2C
+    rows = []
+
+    def measure(name, setup, call):
+        bus = SimI2C(freq=busFreq)
+        si = setup(bus)
+        bus.clear()
+        start = time.perf_counter()
+        for i in range(count):
+            call(si, bus, i)
+        elapsed = time.perf_counter() - start
+        traffic = bus.summary()
+        rows.append({
+            "call": name,
+            "calls_per_s": count / elapsed,
+            "transactions": traffic["transactions"] / count,
+            "bytes": traffic["bytes_written"] / count,
+            "bus_us": traffic["us"] / count,
+        })
+
+    def ready(bus):
+        si = SI5351_I2C(bus)
+        si.setupPLL(si.PLL_A, 32)
+        return si
+
+    measure("__init__", lambda bus: None,
+            lambda si, bus, i: SI5351_I2C(bus))
+    measure("setupPLL", SI5351_I2C,
+            lambda si, bus, i: si.setupPLL(si.PLL_A, 24 + i % 12, i, 1000))
+    measure("set_freq", ready,
+            lambda si, bus, i: si.set_freq(0, si.PLL_A, 7000000 + 10 * i))
+    def instrumented(bus):
+        si = ready(bus)
+        si.instrument()
+        return si
+
+    measure("set_freq+stats", instrumented,
+            lambda si, bus, i: si.set_freq(0, si.PLL_A, 7000000 + 10 * i))
+    measure("set_freqs", SI5351_I2C,
+            lambda si, bus, i: si.set_freqs([7000000 + 10 * i, 14000000, 10000000]))
+    measure("keyer.key", lambda bus: ready(bus).keyer(0, 0, 10140100, (375, 256), 4),
+            lambda keyer, bus, i: keyer.key(i & 3))
+    def quadrature(bus):
+        iq = SI5351_I2C(bus).quadrature()
+        iq.compile(range(7000000, 7300000, 1000))
+        return iq
+
+    measure("iq.step", quadrature,
+            lambda iq, bus, i: iq.step(i % 300))
+    measure("enableOutputs", ready,
+            lambda si, bus, i: si.enableOutputs(i & 1))
+
+    def boot(si, bus, i):
+        si = ready(bus)
+        si.set_freq(0, si.PLL_A, 7000000)
+        si.enableOutputs(True)
+        return si
+
+    image = boot(None, SimI2C(), 0).export_image()
+    measure("boot", lambda bus: None, boot)
+    measure("boot image", lambda bus: None,
+            lambda si, bus, i: SI5351_I2C(bus, image=image))
+    return rows
+
+
+def bench_linux(count=2000):
+    # Syscalls and time per set_freq through the i2c-dev adapter, with
+    # the ioctls carried out by a loopback onto a null bus, sending
+    # every burst at once (queue 1) or the bursts of a call together.
+    from si5351linux import LinuxI2C, Loopback
+    rows = []
+    for queue in (1, 8):
+        loopback = Loopback(NullI2C())
+        si = SI5351_I2C(LinuxI2C(fd=-1, ioctl=loopback, queue=queue), cacheSize=0)
+        si.setupPLL(si.PLL_A, 32)
+        calls = loopback.calls
+        start = time.perf_counter()
+        for i in range(count):
+            si.set_freq(0, si.PLL_A, 7000000 + 10 * i)
+        elapsed = time.perf_counter() - start
+        rows.append({"queue": queue,
+                     "syscalls": (loopback.calls - calls) / count,
+                     "us_per_call": elapsed / count * 1e6})
+    return rows
+
+
+def check_alloc(steps=16, loops=1000):
+    # Check set_freq allocates nothing once its tuning cache is warm,
+    # as when an encoder sweeps back and forth over the same range, and
+    # that a cache miss, as when the encoder moves on through a band,
+    # packs into the buffers of the entry it evicts.
+    # On the device run it with: import bench; bench.check_alloc()
+    si = SI5351_I2C(NullI2C())
+    si.setupPLL(si.PLL_A, 32)
+    cache = si._tune[si.PLL_A]
+    freqs = [7000000 + 10 * i for i in range(steps)]
+    # more frequencies than the cache holds, visited in turn, miss
+    # every time
+    misses = [7100000 + 10 * i for i in range(si.cacheSize + steps)]
+    def sweep(call=si.set_freq, freqs=freqs, loops=loops):
+        for i in range(loops):
+            for freq in freqs:
+                call(0, si.PLL_A, freq)
+    def buffers():
+        return [entry[n] for entry in cache.values() for n in (1, 2)]
+
+    sweep(freqs=misses, loops=1)
+    before = buffers()      # held on to, so their ids cannot be reused
+    sweep(freqs=misses, loops=loops // 100)
+    assert (len(cache) == si.cacheSize and
+            set(id(buf) for buf in buffers()) == set(id(buf) for buf in before)), \
+        "set_freq allocated buffers on a miss"
+    rows = [{"path": "miss", "calls": len(misses) * (loops // 100), "bytes": None}]
+
+    if tracemalloc is None:
+        # MicroPython: any allocation under the heap lock raises
+        # MemoryError.  A miss still allocates the numbers of the divider
+        # math, a few tuples, long ints and the float returned, so those
+        # are only counted.
+        import gc, micropython
+        gc.collect()
+        gc.disable()
+        start = gc.mem_alloc()
+        sweep(freqs=misses, loops=1)
+        rows[0]["bytes"] = (gc.mem_alloc() - start) // len(misses)
+        gc.enable()
+        sweep()
+        micropython.heap_lock()
+        try:
+            sweep()
+        finally:
+            micropython.heap_unlock()
+        rows.append({"path": "hit", "calls": steps * loops, "bytes": 0})
+        return rows
+
+    # CPython has no heap lock, so bound the transient peak of a warm
+    # sweep against the same loop calling a function that does nothing.
+    # What remains is a few boxed ints; a 1 byte bytes, a bytearray or
+    # a short list built per call each take it over the bound.  On a
+    # miss the long int math of the divider dominates the peak, which is
+    # why misses are checked by their buffers above.
+    def peak(call):
+        sweep(call)
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        sweep(call)
+        return tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.start()
+    idle = peak(lambda output, pll, freq: None)
+    transient = peak(si.set_freq)
+    tracemalloc.stop()
+    assert transient - idle <= 144, "set_freq allocated in steady state"
+    rows.append({"path": "hit", "calls": steps * loops, "bytes": transient - idle})
+    return rows
+
+
+def show(title, rows):
+    # print rows of results as a table
+    print(title)
+    print("  ".join("{:>16}".format(key) for key in rows[0]))
+    for row in rows:
+        print("  ".join("{:16.6g}".format(value) if isinstance(value, float)
+                        else "{:>16}".format("-" if value is None else value)
+                        for value in row.values()))
+    print()
+
+
+BENCHMARKS = (
+    ("fraction", bench_fraction),
+    ("planner", bench_planner),
+    ("tuning", bench_tuning),
+    ("calls", bench_calls),
+    ("linux", bench_linux),
+    ("alloc", check_alloc),
+)
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import platform
+    parser = argparse.ArgumentParser(description="si5351 driver benchmarks")
+    parser.add_argument("--json", metavar="FILE", help="save results as JSON (- for stdout)")
+    parser.add_argument("only", nargs="*", help="benchmarks to run (default all)")
+    args = parser.parse_args()
+    results = {"python": platform.python_implementation() + " " + platform.python_version(),
+               "time": int(time.time())}
+    for name, bench in BENCHMARKS:
+        if args.only and name not in args.only:
+            continue
+        results[name] = bench()
+        if args.json != "-":
+            show(name, results[name])
+    if args.json == "-":
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,115 @@
+
+from machine import Pin
+from array import array
+import micropython
+import time
+
+
+# quadrature transition table indexed by (previous AB << 2) | current AB,
+# +1 or -1 for a valid step and 0 for no change or an invalid jump (bounce)
+_QUADRATURE = (0, 1, -1, 0, -1, 0, 0, 1, 1, 0, 0, -1, 0, -1, 1, 0)
+
+
+class Encoder:
+    """
+      ---     ---     ---            ---     ---     ---
+     |   |   |   |   |   |     A    |   |   |   |   |   |
+    -     ---     ---     -        -     ---     ---     --
+    ---     ---     ---                ---     ---     ---
+       |   |   |   |   |       B      |   |   |   |   |   |
+        ---     ---     ---        ---     ---    ---
+          Turn Left                       Turn right
+          A 1 1 0 0 1                     A 1 1 0 0 1
+          B 1 0 0 1 1                     B 0 1 1 0 0
+
+    Both edges of both pins are decoded through a transition table, so
+    contact bounce cancels out instead of needing a settle delay.  Every
+    stepsPer transitions (4 for one full cycle, i.e. one detent on most
+    knobs) a step is pushed into a preallocated ring buffer.  Steps are
+    handed to the handler through micropython.schedule, outside of the
+    interrupt, or can be polled with read().
+
+    accel is a tuple of (ms, multiplier) pairs, fastest first: a step
+    that comes less than ms after the previous one counts multiplier
+    times, e.g. ((10, 100), (40, 10)).
+    """
+
+    def __init__(self, pina, pinb, handler=None, stepsPer=4, size=32, accel=()):
+        self.pina = pina
+        self.pinb = pinb
+        self.position = 0
+        self.stepsPer = stepsPer
+        self._handler = handler
+        self._accelMs = tuple(ms for ms, mult in accel)
+        self._accelMul = tuple(mult for ms, mult in accel)
+        self._ring = array('h', [0] * size)
+        self._head = 0
+        self._tail = 0
+        self._count = 0
+        self._last = time.ticks_ms()
+        self._scheduled = False
+        self._deliver_ref = self._deliver   # no bound method allocation in the IRQ
+        self._state = (pina.value() << 1) | pinb.value()
+        trigger = Pin.IRQ_RISING | Pin.IRQ_FALLING
+        self.pina.irq(trigger=trigger, handler=self._on_edge)
+        self.pinb.irq(trigger=trigger, handler=self._on_edge)
+
+    def irq(self, handler):
+        self._handler = handler
+
+    def _on_edge(self, pin):
+        state = (self.pina.value() << 1) | self.pinb.value()
+        self._count += _QUADRATURE[(self._state << 2) | state]
+        self._state = state
+        if self._count >= self.stepsPer:
+            self._count -= self.stepsPer
+            step = 1
+        elif self._count <= -self.stepsPer:
+            self._count += self.stepsPer
+            step = -1
+        else:
+            return
+
+        # velocity based acceleration
+        now = time.ticks_ms()
+        dt = time.ticks_diff(now, self._last)
+        self._last = now
+        i = 0
+        while i < len(self._accelMs):
+            if dt < self._accelMs[i]:
+                step *= self._accelMul[i]
+                break
+            i += 1
+
+        # push the step, merging it into the newest entry when full
+        size = len(self._ring)
+        head = (self._head + 1) % size
+        if head == self._tail:
+            newest = (self._head - 1) % size
+            self._ring[newest] = max(-32768, min(32767, self._ring[newest] + step))
+        else:
+            self._ring[self._head] = step
+            self._head = head
+
+        if self._handler and not self._scheduled:
+            try:
+                micropython.schedule(self._deliver_ref, None)
+                self._scheduled = True
+            except RuntimeError:
+                pass    # schedule queue full, the next edge retries
+
+    def read(self):
+        # Drain the ring buffer, returning the steps since the last read
+        # and moving position along.
+        delta = 0
+        size = len(self._ring)
+        while self._tail != self._head:
+            delta += self._ring[self._tail]
+            self._tail = (self._tail + 1) % size
+        self.position += delta
+        return delta
+
+    def _deliver(self, arg):
+        self._scheduled = False
+        if self.read() and self._handler:
+            self._handler(self.position)
@@ -2,45 +2,8 @@
 from machine import Pin, I2C
 from si5351 import SI5351_I2C
 from ssd1306 import SSD1306_I2C
-import time
-
-def latch2(p0, p1):
-    a, b = p0.value(), p1.value()
-    while True:
-        a_last, b_last = a, b
-        time.sleep_us(10)
-        a, b = p0.value(), p1.value()
-        if a == a_last and b == b_last: return a, b
-
-
-class Encoder:
-    """
-      ---     ---     ---            ---     ---     ---
-     |   |   |   |   |   |     A    |   |   |   |   |   |  
-    -     ---     ---     -        -     ---     ---     --
-    ---     ---     ---                ---     ---     ---
-       |   |   |   |   |       B      |   |   |   |   |   | 
-        ---     ---     ---        ---     ---    ---  
-          Turn Left                       Turn right
-          A 1 1 0 0 1                     A 1 1 0 0 1
-          B 1 0 0 1 1                     B 0 1 1 0 0
-    """
-
-    def __init__(self, pina, pinb, handler):
-        self.pina = pina
-        self.pinb = pinb
-        self.handler = handler
-        self.position = 0
-        self.last_a = latch2(self.pina, self.pinb)[0]
-        self.pina.irq(trigger=Pin.IRQ_RISING | Pin.IRQ_FALLING, handler=self.ontrigger)
-
-    def ontrigger(self, *args):
-        a, b = latch2(self.pina, self.pinb)
-        if a == 1 and self.last_a == 0:
-            self.position += 1 if a == b else -1
-            self.handler(self.position)
-        self.last_a = a
-
+from encoder import Encoder
+import uasyncio as asyncio
 
 # gpio pins
 
@@ -55,16 +18,42 @@ PIN_C   = 14
 center = 7000000
 mult = 32
 clk = 0
+accel = ((10, 100), (40, 10))   # fast spins step 1kHz or 100Hz instead of 10Hz
+fps = 10                        # display refreshes per second at most
 
 # functions
 
+freq = center
+
 def onchange(value):
+    # tuning path: write the synthesizer right away, the display
+    # task catches up at its own pace
+    global freq
     freq = center + value * 10
-    oled.fill(0)
-    oled.text('{:d} Hz'.format(freq), 0, 0)
-    oled.show()
     si.set_freq(clk, si.PLL_A, freq)
 
+def show_page(page):
+    # push one 8 pixel high page of the framebuffer (128 bytes)
+    # instead of all of it like oled.show() does
+    oled.write_cmd(0x21)    # column address
+    oled.write_cmd(0)
+    oled.write_cmd(127)
+    oled.write_cmd(0x22)    # page address
+    oled.write_cmd(page)
+    oled.write_cmd(page)
+    oled.write_data(memoryview(oled.buffer)[128 * page:128 * (page + 1)])
+
+async def display():
+    # redraw the frequency line only when it changed, fps times a second at most
+    shown = None
+    while True:
+        if freq != shown:
+            shown = freq
+            oled.fill_rect(0, 0, 128, 8, 0)
+            oled.text('{:d} Hz'.format(shown), 0, 0)
+            show_page(0)
+        await asyncio.sleep_ms(1000 // fps)
+
 # i2c bus
 
 i2c = I2C(-1, Pin(PIN_SCL), Pin(PIN_SDA))
@@ -72,6 +61,8 @@ i2c = I2C(-1, Pin(PIN_SCL), Pin(PIN_SDA))
 # oled
 
 oled = SSD1306_I2C(128, 32, i2c)
+oled.fill(0)
+oled.show()
 
 # si5351 frequency generator
 
@@ -84,8 +75,6 @@ si.enableOutputs(True)
 
 Encoder(Pin(PIN_A, Pin.IN, Pin.PULL_UP), 
         Pin(PIN_B, Pin.IN, Pin.PULL_UP),
-        onchange)
-
-while True:
-   pass
+        onchange, accel=accel)
 
+asyncio.run(display())
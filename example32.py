@@ -1,7 +1,8 @@
 
 from micropython import const
 from machine import Pin, I2C
-from si5351 import SI5351_I2C
+from si5351 import SI5351_I2C, SI5351_REGISTER_3_OUTPUT_ENABLE_CONTROL
+from encoder import Encoder
 import bluetooth
 import struct
 import time
@@ -60,15 +61,36 @@ _UART_SERVICE = (
 _IRQ_CENTRAL_CONNECT = const(1)
 _IRQ_CENTRAL_DISCONNECT = const(2)
 _IRQ_GATTS_WRITE = const(4)
+_IRQ_MTU_EXCHANGED = const(21)
+
+_MTU = const(247)          # ATT MTU offered to the phone, so one write carries a whole packet
+_MTU_DEFAULT = const(23)   # ATT MTU until the phone exchanges one
 
 class BLEUART:
-    def __init__(self, ble, name="bluefo"):
+    # Notifications are rate limited: write() only keeps the latest
+    # value, and it is notified to a connection at most once every
+    # interval_ms.  Values replaced before they went out are dropped
+    # and counted in coalesced; sent counts notifications made.
+    # Call flush() regularly to send what is due.  payload() tells how
+    # long a write the phones connected can make, from the MTU each
+    # negotiated.
+
+    def __init__(self, ble, name="bluefo", interval_ms=100):
+        self.interval_ms = interval_ms
+        self.sent = 0
+        self.coalesced = 0
+        self._pending = None
+        self._due = set()
+        self._last = {}
         self._handler = None
         self._connections = set()
+        self._mtu = {}
         self._ble = ble
         self._ble.active(True)
+        self._ble.config(mtu=_MTU)
         self._ble.irq(handler=self._irq)
         ((self._tx_handle, self._rx_handle,),) = self._ble.gatts_register_services((_UART_SERVICE,))
+        self._ble.gatts_set_buffer(self._rx_handle, _MTU - 3)
         self._payload = advertising_payload(
             name=name, 
             appearance=_ADV_APPEARANCE_GENERIC_COMPUTER)
@@ -78,11 +100,18 @@ class BLEUART:
         if event == _IRQ_CENTRAL_CONNECT:
             conn_handle, _, _ = data
             self._connections.add(conn_handle)
+            self._mtu[conn_handle] = _MTU_DEFAULT
         elif event == _IRQ_CENTRAL_DISCONNECT:
             conn_handle, _, _ = data
             if conn_handle in self._connections:
                 self._connections.remove(conn_handle)
+            self._due.discard(conn_handle)
+            self._last.pop(conn_handle, None)
+            self._mtu.pop(conn_handle, None)
             self._advertise()
+        elif event == _IRQ_MTU_EXCHANGED:
+            conn_handle, mtu = data
+            self._mtu[conn_handle] = mtu
         elif event == _IRQ_GATTS_WRITE:
             conn_handle, value_handle = data
             data = self._ble.gatts_read(value_handle)
@@ -95,54 +124,39 @@ class BLEUART:
     def irq(self, handler):
         self._handler = handler
 
-    def write(self, data):
-        self._ble.gatts_write(self._tx_handle, data)
+    def payload(self):
+        # the longest write all connections carry, ATT MTU less 3
+        mtu = _MTU
         for conn_handle in self._connections:
-            self._ble.gatts_notify(conn_handle, self._tx_handle, data)
-
-
-# rotary encoder
-
-def latch2(p0, p1):
-    a, b = p0.value(), p1.value()
-    while True:
-        a_last, b_last = a, b
-        time.sleep_us(10)
-        a, b = p0.value(), p1.value()
-        if a == a_last and b == b_last: return a, b
-
-
-class Encoder:
-    """
-      ---     ---     ---            ---     ---     ---
-     |   |   |   |   |   |     A    |   |   |   |   |   |  
-    -     ---     ---     -        -     ---     ---     --
-    ---     ---     ---                ---     ---     ---
-       |   |   |   |   |       B      |   |   |   |   |   | 
-        ---     ---     ---        ---     ---    ---  
-          Turn Left                       Turn right
-          A 1 1 0 0 1                     A 1 1 0 0 1
-          B 1 0 0 1 1                     B 0 1 1 0 0
-    """
-
-    def __init__(self, pina, pinb):
-        self.pina = pina
-        self.pinb = pinb
-        self.position = 0
-        self._handler = None
-        self.last_a = latch2(self.pina, self.pinb)[0]
-        self.pina.irq(trigger=Pin.IRQ_RISING | Pin.IRQ_FALLING, handler=self._on_trigger)
+            mtu = min(mtu, self._mtu.get(conn_handle, _MTU_DEFAULT))
+        return mtu - 3
 
-    def _on_trigger(self, *args):
-        a, b = latch2(self.pina, self.pinb)
-        if a == 1 and self.last_a == 0:
-            self.position += 1 if a == b else -1
-            if self._handler:
-                self._handler(self.position)
-        self.last_a = a
-
-    def irq(self, handler):
-        self._handler = handler
+    def write(self, data, coalesce=True):
+        # With coalesce false, as for acknowledgments, notify at once.
+        self._ble.gatts_write(self._tx_handle, data)
+        if not coalesce:
+            for conn_handle in self._connections:
+                self._notify(conn_handle, data)
+            return
+        if self._due:
+            self.coalesced += 1
+        self._pending = data
+        self._due = set(self._connections)
+        self.flush()
+
+    def flush(self):
+        now = time.ticks_ms()
+        for conn_handle in list(self._due):
+            if time.ticks_diff(now, self._last.get(conn_handle, now - self.interval_ms)) >= self.interval_ms:
+                self._notify(conn_handle, self._pending)
+                self._due.discard(conn_handle)
+        if not self._due:
+            self._pending = None
+
+    def _notify(self, conn_handle, data):
+        self._ble.gatts_notify(conn_handle, self._tx_handle, data)
+        self._last[conn_handle] = time.ticks_ms()
+        self.sent += 1
 
 
 # gpio pins
@@ -157,11 +171,115 @@ PIN_B   = 12
 
 mult = 32
 clk = 0
+accel = ((10, 100), (40, 10))   # fast spins step 1kHz or 100Hz instead of 10Hz
+
+# binary protocol
+#
+# A packet is  A5 seq count  followed by count commands, all little endian:
+#   01 output pll freq:u32            set_freq
+#   02 mask                           enable the outputs in mask, disable the rest
+#   03 pll mult num:u32 denom:u32     setupPLL
+#   04 n freq:u32 * n                 set_freqs, frequency plan for outputs 0..n-1
+#   05 n:u16 freq:u32 * n             channel list the knob steps through (n = 0 clears)
+# and is answered by one notification  5A seq done status max:u16, where
+# done is the number of commands carried out and status 0 for success, 1
+# for an unknown command, 2 for a truncated packet, 3 if a command failed,
+# which includes an output or PLL number out of range, or 4 for a packet
+# cut off at the length the link carries.  max is that length, the ATT
+# MTU negotiated with the phone less 3, 20 bytes if it did not ask for
+# a larger one; longer packets have to be split.
+# Anything not starting with A5 is taken as a frequency in text, as
+# typed into nRF Connect.
+
+_PACKET = const(0xA5)
+_ACK = const(0x5A)
+
+_CMD_SET_FREQ = const(1)
+_CMD_ENABLE = const(2)
+_CMD_SETUP_PLL = const(3)
+_CMD_PLAN = const(4)
+_CMD_CHANNELS = const(5)
+
+_OK = const(0)
+_UNKNOWN = const(1)
+_TRUNCATED = const(2)
+_FAILED = const(3)
+_TOO_LONG = const(4)
+
+_OUTPUTS = const(3)     # CLK0..CLK2 of the Si5351A
+
+channels = []
+
+def need(data, end):
+    if end > len(data):
+        raise IndexError
+
+def check(value, limit):
+    # out of range fields fail the command, they are not a short packet
+    if value >= limit:
+        raise ValueError(value)
+
+def run_command(data, i):
+    # carry out the command at data[i], returning the index of the next
+    global channels
+    op = data[i]
+    if op == _CMD_SET_FREQ:
+        need(data, i + 7)
+        output, pll, freq = struct.unpack_from("<BBI", data, i + 1)
+        check(output, _OUTPUTS)
+        check(pll, 2)
+        si.set_freq(output, pll, freq)
+        return i + 7
+    if op == _CMD_ENABLE:
+        need(data, i + 2)
+        si.write8(SI5351_REGISTER_3_OUTPUT_ENABLE_CONTROL, ~data[i + 1] & 0xFF)
+        return i + 2
+    if op == _CMD_SETUP_PLL:
+        need(data, i + 11)
+        pll, mult, num, denom = struct.unpack_from("<BBII", data, i + 1)
+        check(pll, 2)
+        si.setupPLL(pll, mult, num, denom)
+        return i + 11
+    if op == _CMD_PLAN:
+        need(data, i + 2)
+        n = data[i + 1]
+        need(data, i + 2 + 4 * n)
+        check(n, _OUTPUTS + 1)
+        si.set_freqs(struct.unpack_from("<{}I".format(n), data, i + 2))
+        return i + 2 + 4 * n
+    if op == _CMD_CHANNELS:
+        need(data, i + 3)
+        n = struct.unpack_from("<H", data, i + 1)[0]
+        need(data, i + 3 + 4 * n)
+        channels = list(struct.unpack_from("<{}I".format(n), data, i + 3))
+        encoder.position = 0
+        return i + 3 + 4 * n
+    raise KeyError(op)
+
+def on_packet(data):
+    seq, count = data[1], data[2]
+    done, status, i = 0, _OK, 3
+    try:
+        while done < count:
+            i = run_command(data, i)
+            done += 1
+    except KeyError:
+        status = _UNKNOWN
+    except IndexError:
+        status = _TOO_LONG if len(data) >= uart.payload() else _TRUNCATED
+    except (ValueError, OSError):
+        status = _FAILED
+    uart.write(struct.pack("<BBBBH", _ACK, seq, done, status, uart.payload()), coalesce=False)
 
 # functions
 
 def on_encoder(position):
-    on_uart(position * 10)
+    if channels:
+        freq = channels[position % len(channels)]
+        si.set_freq(clk, si.PLL_A, freq)
+        uart.write(str(freq).encode())
+    else:
+        on_uart(position * 10)
 
 def on_uart(freq):
     try:
@@ -172,22 +290,29 @@ def on_uart(freq):
     except ValueError:
         pass
 
+def on_rx(data):
+    if len(data) >= 3 and data[0] == _PACKET:
+        on_packet(data)
+    else:
+        on_uart(data)
+
 # initialize
 
 i2c = I2C(-1, Pin(PIN_SCL), Pin(PIN_SDA))
 si = SI5351_I2C(i2c)
 si.setupPLL(si.PLL_A, mult)
-encoder = Encoder(Pin(PIN_A, Pin.IN, Pin.PULL_UP), Pin(PIN_B, Pin.IN, Pin.PULL_UP))
+encoder = Encoder(Pin(PIN_A, Pin.IN, Pin.PULL_UP), Pin(PIN_B, Pin.IN, Pin.PULL_UP), accel=accel)
 ble = bluetooth.BLE()
 uart = BLEUART(ble)
 
 # main 
 
 on_uart(7000000)
-uart.irq(handler=on_uart)
+uart.irq(handler=on_rx)
 encoder.irq(handler=on_encoder)
 si.enableOutputs(True)
 
 while True:
-   pass
+    uart.flush()
+    time.sleep_ms(10)
 
@@ -54,7 +54,12 @@ si.enableOutputs(True)
 I also added a method called set_freq.  This function
 calculates and sets the multisynth and R dividers
 based on the current VCO frequency of the PLL in use.
-It only works for frequencies below about 100Mhz.
+Above a eighth of the VCO frequency (100MHz for an 800MHz VCO), up to
+200MHz, it instead sets the multisynth to an integer divider of 8, 6
+or 4 (DIVBY4) and tunes the PLL, so steps that keep the divider only
+write the changed bytes of the PLL parameter block.  Since this moves
+the VCO, such an output needs a PLL of its own: set_freq raises
+ValueError while another powered up output runs from the same PLL.
 
 Here is an example:
 
@@ -69,6 +74,269 @@ si.set_freq(clk, si.PLL_A, 7000000)
 si.enableOutputs(True)
 ```
 
+set_freq returns the frequency actually produced.  The multisynth
+fraction is fitted into 20 bits with a best rational approximation,
+so the error is well below 1 Hz.  Similarly set_vco(pll, fvco) sets a PLL
+to the closest reachable VCO frequency and returns it.
+Run bench.py on the host to compare the fraction fitting against
+the simple halving used before.
+
+setupPLL resets both PLLs every time it is called.  To move a running
+PLL use retune_pll(pll, mult, num, denom) or set_vco(pll, fvco, fast=True)
+instead.  When the integer multiplier stays the same only the changed
+fractional registers are written and the PLL is not reset, otherwise only
+that PLL is reset so the outputs of the other PLL keep running.
+
+### Transactions
+
+Every driver call normally writes its registers right away, so a retune
+made of several calls goes out in many small transactions and the chip
+passes through half configured states.  Inside a transaction the writes
+are only staged in the register shadow, and on commit they go out
+merged into the fewest bursts: outputs being turned off are disabled
+first, then the configuration registers, then the PLL resets and
+finally the outputs being turned on are enabled.  begin() and commit()
+do the same without a with block, and an exception inside the block
+discards the staged writes.
+
+```python
+with si.transaction():
+    si.setupPLL(si.PLL_A, 36)
+    si.setupMultisynth(0, si.PLL_A, 100, 1, 3)
+    si.setupRdiv(0, si.R_DIV_4)
+    si.enableOutputs(True)
+```
+
+### PLL lock and status
+
+Resetting a PLL (setupPLL, set_freqs, or retune_pll with a new integer
+multiplier) takes the outputs off frequency until the PLL locks again.
+Instead of a fixed sleep, wait_lock(pll) polls the device status register
+and returns as soon as the PLL is locked, with the time it took in
+microseconds.  It raises LockError (an OSError) if the PLL is not locked
+within timeout_us or the crystal signal is lost.  wait_lock(pll, 0) only
+checks that the PLL is still locked.  status() returns the raw status
+register (see the SI5351_STATUS_ bits), and read8 and readBlock read
+registers back, the latter in a single burst.
+
+```python
+si.setupPLL(si.PLL_A, 32)
+us = si.wait_lock(si.PLL_A)
+```
+
+### Frequency sweeps
+
+sweep returns a sweep engine for scalar network analysis or filter
+alignment.  Every step is compiled ahead of time into the few register
+bytes that differ from the previous step, so playback at a fixed dwell
+time is a short burst per step.  The optional callback runs after each
+step for sampling a detector.  run() plays it back busy-waiting for the
+step edges, arun() from an asyncio task and start(timer) from a
+machine.Timer.  All of them report the achieved steps per second and
+the timing jitter.
+
+```python
+def sample(index, freq, achieved):
+    levels.append(adc.read())
+
+stats = si.sweep(0, si.PLL_A, 7000000, 7200000, 100, dwell_us=500, callback=sample).run()
+```
+
+### Quadrature output
+
+quadrature returns an I/Q pair for SDR front ends: CLK0 and CLK1 at the
+same frequency with CLK1 lagging by 90 degrees.  Both multisynths
+divide the PLL by the same even integer N and the phase offset of CLK1
+is set to N, so the pair covers about 4.8MHz to 112MHz.  Setting the
+first frequency writes the PLL, both multisynths and the phase offsets
+in ascending bursts and resets only that PLL.  Retuning with the same N
+only moves the PLL fraction, which keeps the pair in quadrature.  For
+stepping across a band, compile() works out the PLL registers of every
+step up front on a common denominator, so that step() writes a few
+bytes in a single burst.
+
+```python
+iq = si.quadrature()
+iq.set_freq(7074000)
+si.enableOutputs(True)
+iq.compile(range(7000000, 7300000, 1000))
+iq.step(100)            # 7100000 Hz
+```
+
+### Symbol keying
+
+keyer returns a keyer for digital modes such as WSPR, FT8 or CW-FSK,
+which shift an output between tones a few Hz apart at exact symbol
+boundaries.  The multisynth registers of every tone base + k * spacing
+are worked out up front with a shared fraction denominator, so keying a
+symbol is a single burst of the few bytes that differ between tones,
+often just one.  Fractional spacings are given as (num, denom) pairs.
+The achieved tone frequencies are in the achieved attribute.  send()
+keys the symbols busy-waiting for the symbol edges, asend() from an
+asyncio task and start(timer) from a machine.Timer.  The optional hook
+runs after each symbol is written with how late the edge was in
+microseconds, and stats() sums it up.
+
+```python
+keyer = si.keyer(0, si.PLL_A, 10140100, (375, 256), 4)   # WSPR on 30m
+si.enableOutputs(True)
+stats = keyer.send(symbols, 682667)
+```
+
+### Frequency planning
+
+Instead of picking the PLL multipliers by hand, set_freqs takes the
+frequencies of all outputs and chooses the VCO of both PLLs and which
+output runs from which.  It prefers even integer multisynth dividers,
+which have the lowest jitter.  The whole chip is then programmed in a few
+bursts and the achieved frequencies are returned.
+
+```python
+si.set_freqs([7000000, 14000000, 10000000])
+si.enableOutputs(True)
+```
+
+### Channel tables
+
+For fixed channel plans of thousands of channels the divider math can
+be done ahead of time on the host.  si5351table.py (CPython and NumPy)
+works out the set_freq registers of a whole frequency range at once,
+prints the worst and mean frequency error and writes a table file of 9
+bytes per channel.  On the device open_table reads channels from that
+file by index without loading it, so changing channel is a seek and a
+burst write.
+
+```bash
+python3 si5351table.py 7000000 7300000 10 -o 40m.tbl
+```
+
+```python
+channels = si.open_table(open("40m.tbl", "rb"))
+channels.tune(1234)     # 7012340 Hz
+```
+
+### asyncio
+
+si5351async.py wraps the driver for uasyncio (or asyncio on the host).
+tune(output, freq) returns at once and a task per output writes the
+newest requested frequency; requests that arrive while one is pending
+replace it, so a fast turning knob never queues up stale frequencies.
+await set_freq(output, freq) returns once the frequency, or a newer one,
+is written, and stats() counts the requests dropped as superseded.
+
+```python
+from si5351async import AsyncSI5351
+
+async def main():
+    tuner = AsyncSI5351(si)
+    tuner.tune(0, 7000000)
+    await tuner.set_freq(0, 7000010)
+```
+
+### Saving the configuration
+
+export_image returns the current configuration as a compact binary
+register image.  Passing it to the constructor (or to load_image) at boot
+applies it in a few bursts: outputs disabled, the registers written,
+both PLLs reset and finally the saved output enables.  The image holds
+the documented configuration registers only, never the reserved ones;
+those the driver has not written yet are read back from the device
+first, so the image is always complete.  load_image rejects images
+holding only part of a PLL or multisynth parameter block.
+
+```python
+with open("si5351.img", "wb") as f:
+    f.write(si.export_image())
+...
+with open("si5351.img", "rb") as f:
+    si = si5351.SI5351_I2C(i2c, image=f.read())
+```
+
+### Many devices
+
+si5351fleet.py programs many SI5351s, on any number of I2C buses, from
+one frequency plan.  Buses are programmed in parallel, devices sharing a
+bus one after the other: on CPython each bus gets a thread, on
+MicroPython the buses are interleaved so that while one device waits
+for its PLLs to lock (lock=True) the others are served.  apply()
+returns the total time and per device the time, the achieved
+frequencies and the error if it failed.
+
+```python
+from si5351fleet import Fleet
+
+fleet = Fleet()
+fleet.add("rx", SI5351_I2C(i2c0))
+fleet.add("tx", SI5351_I2C(i2c1))
+report = fleet.apply({{"rx": [7000000, 7000000], "tx": [14000000]}}, lock=True)
+print(report["total_us"], report["devices"]["rx"]["us"])
+```
+
+### Instrumentation
+
+instrument() turns on counters for bus transactions, bytes written and
+read, bus errors and tuning cache hits and misses, plus the number of
+calls and the total and worst time in microseconds of every driver
+method, for finding out where time goes.  An optional trace hook gets
+every register write with a timestamp.  stats() returns it all and
+reset_stats() starts over.  instrument(False) takes the counting bus
+proxy and the timing wrappers away again, so the driver runs no extra
+code at all while instrumentation is off.
+
+```python
+si.instrument(trace=lambda us, register, data: print(us, register, bytes(data)))
+si.set_freq(0, si.PLL_A, 7000000)
+print(si.stats())
+```
+
+### Running on the host
+
+si5351sim.py provides SimI2C, a stand-in for machine.I2C that simulates
+the SI5351 register file on CPython.  It records every transaction with
+its size and estimated wire time at the given bus speed, and decodes
+the registers back into the output frequencies.
+
+```python
+from si5351 import SI5351_I2C
+from si5351sim import SimI2C
+
+bus = SimI2C(freq=100000)
+si = SI5351_I2C(bus)
+si.setupPLL(si.PLL_A, 32)
+bus.clear()
+si.set_freq(0, si.PLL_A, 7000000)
+print(bus.summary(), float(bus.frequency(0)))
+```
+
+bench.py uses it to measure calls per second, bus transactions, bytes
+and wire time per call, peak memory and the worst frequency error of
+set_freq across every R divider band, along with the other driver calls.
+Run `python3 bench.py --json results.json` to keep the results
+for comparing releases.
+
+The tests in tests/ check the register output on SimI2C, from the
+shadow and transactions to the keyer, sweeps and the quadrature pair.
+Run them with `python3 -m pytest tests`; numpy is only needed for the
+channel table test.
+
+### Linux i2c-dev
+
+si5351linux.py provides LinuxI2C, a bus adapter for CPython on Linux
+(Raspberry Pi and the like) with the writeto_mem and readfrom_mem calls
+of machine.I2C on top of /dev/i2c-N.  Transfers are I2C_RDWR ioctls
+built in preallocated ctypes buffers: a register read is one ioctl with
+a repeated start, and the bursts of a driver call are queued and sent as
+the messages of a single ioctl.  Passing ioctl=Loopback(SimI2C()) runs
+it without hardware.  `python3 bench.py linux` reports the syscalls and
+microseconds per set_freq.
+
+```python
+from si5351 import SI5351_I2C
+from si5351linux import LinuxI2C
+
+si = SI5351_I2C(LinuxI2C(1))    # /dev/i2c-1
+```
+
 ### ESP8266 VFO Example
 
 The next example is an implementation of a VFO using the SI5351.
@@ -78,7 +346,20 @@ and it is provided in the repo as example.py.
 To use the VFO, attach a rotary knob to GPIO pins 12 and 13 of the WIFIKIT.
 Next connect GPIO pins 4 and 5 for SDA and SCL to the same I2C pins
 on the SI5351.  When the code first starts clk 0 will output 7Mhz.
-Turning the knob will change the clk 0 frequency in 10 Hz steps.
+Turning the knob will change the clk 0 frequency in 10 Hz steps,
+or in bigger steps when it is spun fast.
+
+The rotary encoder is read by encoder.py, which decodes all edges of
+both pins through a quadrature table inside the pin interrupt,
+queues the steps in a ring buffer and calls the handler later
+through micropython.schedule, so no I2C traffic happens in interrupt
+context.  Copy it to the board along with si5351.py.
+
+The knob handler only writes the SI5351.  The display shares the I2C bus,
+so a separate uasyncio task redraws just the frequency line, at most
+fps times a second and only when it changed, and pushes only that page
+of the framebuffer.  Tuning latency stays the same however fast the
+knob turns.
 
 { run("cat example.py", "python") }
 
@@ -91,6 +372,15 @@ Script example32.py does the same thing as the prior example
 but the frequency can also be set and read using bluetooth.
 Connect to the _bluefo_ device using the _nRF Connect_ app.
 
+Besides frequencies typed as text, the UART characteristic accepts a
+compact binary packet carrying several commands: set_freq, output
+enables, setupPLL, a set_freqs frequency plan and a channel list for
+the knob to step through.  Each packet is answered by a single
+acknowledgment with its sequence number.  The device offers a 247 byte
+MTU so a whole plan or channel list fits into one write, and every
+acknowledgment carries the packet size the MTU negotiated with the
+phone allows.  The packet layout is documented in example32.py.
+
 ![](example32.jpg)
 """)
 
@@ -1,4 +1,28 @@
 
+try:
+    import micropython
+except ImportError:
+    # CPython: run the code emitter hints as plain Python
+    class micropython:
+        @staticmethod
+        def native(f):
+            return f
+
+try:
+    from time import ticks_us, ticks_add, ticks_diff, sleep_us
+except ImportError:
+    # CPython; the helper modules take these from here as well
+    import time
+    def ticks_us():
+        return time.perf_counter_ns() // 1000
+    def ticks_add(ticks, delta):
+        return ticks + delta
+    def ticks_diff(ticks1, ticks2):
+        return ticks1 - ticks2
+    def sleep_us(us):
+        time.sleep(us / 1e6)
+
+
 SI5351_I2C_ADDRESS_DEFAULT = 0x60
 
 SI5351_CRYSTAL_LOAD_6PF    = (1<<6)
@@ -10,6 +34,25 @@ SI5351_CRYSTAL_FREQ_27MHZ  = 27000000
 
 SI5351_MULTISYNTH_C_MAX    = 1048575
 SI5351_CLKOUT_MIN_FREQ     = 4000
+SI5351_CLKOUT_MAX_FREQ     = 200000000
+
+SI5351_VCO_MIN_FREQ        = 600000000
+SI5351_VCO_MAX_FREQ        = 900000000
+SI5351_PLAN_MAX_OUTPUTS    = 6     # MS0..MS5 have fractional parameter blocks
+
+SI5351_REGISTER_COUNT      = 188   # registers 0..187 are shadowed
+SI5351_IMAGE_MAGIC         = b"S5" # header of a register image, see export_image
+# the configuration registers a register image holds, as (first, last + 1):
+# output enable, OEB pin mask, PLL input source up to the MS6/7 dividers,
+# spread spectrum, VCXO and phase offsets, crystal load and fanout enable
+SI5351_IMAGE_RANGES        = ((3, 4), (9, 10), (15, 93), (149, 171), (183, 184), (187, 188))
+SI5351_BURST_GAP           = 2     # clean bytes worth resending to join two bursts
+SI5351_PHASE_OFFSET_MAX    = 127   # CLKx_PHOFF is 7 bits, in quarter VCO periods
+
+SI5351_TABLE_MAGIC         = b"ST" # header of a channel table, see si5351table.py
+SI5351_TABLE_HEADER        = "<2sBBIIII"   # magic, pll, mult, num, denom, crystal, count
+SI5351_TABLE_HEADER_SIZE   = 20
+SI5351_TABLE_RECORD_SIZE   = 9     # multisynth parameter block and clk control
 
 SI5351_REGISTER_16_CLK0_CONTROL                       = 16
 SI5351_REGISTER_17_CLK1_CONTROL                       = 17
@@ -28,10 +71,276 @@ SI5351_REGISTER_44_MULTISYNTH0_PARAMETERS_3           = 44
 SI5351_REGISTER_52_MULTISYNTH1_PARAMETERS_3           = 52
 SI5351_REGISTER_60_MULTISYNTH2_PARAMETERS_3           = 60
 
+SI5351_REGISTER_0_DEVICE_STATUS                       = 0
 SI5351_REGISTER_3_OUTPUT_ENABLE_CONTROL               = 3
+SI5351_REGISTER_165_CLK0_PHASE_OFFSET                 = 165
 SI5351_REGISTER_177_PLL_RESET                         = 177
 SI5351_REGISTER_183_CRYSTAL_INTERNAL_LOAD_CAPACITANCE = 183
 
+SI5351_STATUS_SYS_INIT  = (1<<7)  # device still initializing
+SI5351_STATUS_LOL_B     = (1<<6)  # PLL B loss of lock
+SI5351_STATUS_LOL_A     = (1<<5)  # PLL A loss of lock
+SI5351_STATUS_LOS_CLKIN = (1<<4)  # loss of CLKIN signal (Si5351C)
+SI5351_STATUS_LOS_XTAL  = (1<<3)  # loss of crystal signal
+
+
+@micropython.native
+def packParameters(buf, a, b, c, rdiv=0):
+    # Lay out the PLL or multisynth divider a + b / c as the 8
+    # consecutive parameter registers in buf, using integer math only
+    # so it neither allocates nor touches floats.  The rdiv bits only
+    # apply to the output multisynths and share a register with P1[17:16].
+    #
+    # P1[17:0] = 128 * a + floor(128 * b / c) - 512
+    # P2[19:0] = 128 * b - c * floor(128 * b / c)
+    # P3[19:0] = c
+    #
+    # An output multisynth dividing by exactly 4 needs MSx_DIVBY4 set
+    # instead, with P1 = P2 = 0 and P3 = 1.
+    if a == 4 and b == 0:
+        buf[0] = 0
+        buf[1] = 1
+        buf[2] = ((rdiv & 0x07) << 4) | 0x0C
+        for i in range(3, 8):
+            buf[i] = 0
+        return buf
+    t  = (b << 7) // c
+    P1 = (a << 7) + t - 512
+    P2 = (b << 7) - c * t
+    P3 = c
+    buf[0] = (P3 & 0x0000FF00) >> 8
+    buf[1] = (P3 & 0x000000FF)
+    buf[2] = ((rdiv & 0x07) << 4) | ((P1 & 0x00030000) >> 16)
+    buf[3] = (P1 & 0x0000FF00) >> 8
+    buf[4] = (P1 & 0x000000FF)
+    buf[5] = ((P3 & 0x000F0000) >> 12) | ((P2 & 0x000F0000) >> 16)
+    buf[6] = (P2 & 0x0000FF00) >> 8
+    buf[7] = (P2 & 0x000000FF)
+    return buf
+
+
+def bestFraction(num, denom, maxDenom=SI5351_MULTISYNTH_C_MAX):
+    # Return p, q with q <= maxDenom such that p / q is the closest
+    # fraction to num / denom (0 <= num < denom), using the continued
+    # fraction expansion and its semiconvergents (Stern-Brocot search).
+    # Integer arithmetic only.  p == q means the fraction rounded up to 1.
+    if denom <= maxDenom:
+        return num, denom
+    p0, q0, p1, q1 = 0, 1, 1, 0
+    n, d = num, denom
+    while True:
+        a = n // d
+        q2 = q0 + a * q1
+        if q2 > maxDenom:
+            break
+        p0, q0, p1, q1 = p1, q1, p0 + a * p1, q2
+        n, d = d, n - a * d
+        if d == 0:
+            return p1, q1
+    # the largest semiconvergent between the last two convergents,
+    # taken only if it is closer than the last convergent itself
+    k = (maxDenom - q0) // q1
+    p2, q2 = p0 + k * p1, q0 + k * q1
+    if abs(p2 * denom - num * q2) * q1 < abs(p1 * denom - num * q1) * q2:
+        return p2, q2
+    return p1, q1
+
+
+def rDivider(freq):
+    # Pick the R divider that brings a low output frequency up into
+    # the multisynth range, returning it with the scaled up frequency.
+    r_div = SI5351_I2C.R_DIV_1
+    if (freq >= SI5351_CLKOUT_MIN_FREQ and 
+        freq <  SI5351_CLKOUT_MIN_FREQ * 2):
+        r_div = SI5351_I2C.R_DIV_128
+        freq *= 128
+    elif (freq >= SI5351_CLKOUT_MIN_FREQ * 2 and 
+          freq <  SI5351_CLKOUT_MIN_FREQ * 4):
+        r_div = SI5351_I2C.R_DIV_64
+        freq *= 64
+    elif (freq >= SI5351_CLKOUT_MIN_FREQ * 4 and 
+          freq <  SI5351_CLKOUT_MIN_FREQ * 8):
+        r_div = SI5351_I2C.R_DIV_32
+        freq *= 32
+    elif (freq >= SI5351_CLKOUT_MIN_FREQ * 8 and 
+          freq <  SI5351_CLKOUT_MIN_FREQ * 16):
+        r_div = SI5351_I2C.R_DIV_16
+        freq *= 16
+    elif (freq >= SI5351_CLKOUT_MIN_FREQ * 16 and
+          freq <  SI5351_CLKOUT_MIN_FREQ * 32):
+        r_div = SI5351_I2C.R_DIV_8
+        freq *= 8
+    elif (freq >= SI5351_CLKOUT_MIN_FREQ * 32 and
+          freq <  SI5351_CLKOUT_MIN_FREQ * 64):
+        r_div = SI5351_I2C.R_DIV_4
+        freq *= 4
+    elif (freq >= SI5351_CLKOUT_MIN_FREQ * 64 and
+          freq <  SI5351_CLKOUT_MIN_FREQ * 128):
+        r_div = SI5351_I2C.R_DIV_2
+        freq *= 2
+    return r_div, freq
+
+
+def divider(f, freq):
+    # Split f / freq into a + b / c with c fitting into 20 bits, as
+    # needed for both the multisynth and the PLL feedback dividers.
+    a = f // freq
+    b, c = bestFraction(f % freq, freq)
+    if b == c:
+        a, b, c = a + 1, 0, 1
+    return a, b, c
+
+
+def planFrequencies(freqs, crystalFreq=SI5351_CRYSTAL_FREQ_25MHZ):
+    # Work out the PLL and multisynth settings for the output
+    # frequencies in freqs (indexed by output, None or 0 if unused).
+    # Returns (vco, outputs) where vco holds the VCO frequency of
+    # PLL A and PLL B (0 if unused) and outputs a (pll, div, num, denom,
+    # r_div) tuple per output, or None.
+    #
+    # Outputs that divide their VCO by an even integer run in
+    # integer mode for the lowest jitter, so the plan maximizes their
+    # count, then prefers using one PLL over two and PLLs with integer
+    # multipliers.  The search
+    # tries every split of at most SI5351_PLAN_MAX_OUTPUTS outputs over
+    # the two PLLs, and per PLL only VCOs that are an even multiple
+    # of one of its outputs or an integer multiple of the crystal, so
+    # it stays bounded on the MCU.
+    used = [i for i in range(len(freqs)) if freqs[i]]
+    if len(used) > SI5351_PLAN_MAX_OUTPUTS:
+        raise ValueError("too many outputs")
+    scaled, evens = {}, {}
+    for i in used:
+        r_div, f = rDivider(freqs[i])
+        while f * 900 < SI5351_VCO_MIN_FREQ and r_div < SI5351_I2C.R_DIV_128:
+            r_div, f = r_div + 1, f * 2
+        scaled[i] = (r_div, f)
+        lo = max(6, -(-SI5351_VCO_MIN_FREQ // f))
+        hi = min(900, SI5351_VCO_MAX_FREQ // f)
+        evens[i] = set(f * d for d in range(lo + (lo & 1), hi + 1, 2))
+    xtal = set(crystalFreq * m for m in range(
+        -(-SI5351_VCO_MIN_FREQ // crystalFreq), SI5351_VCO_MAX_FREQ // crystalFreq + 1))
+
+    def best(group):
+        # best VCO for the outputs in group as (evens, integer pll, vco)
+        pool = set(xtal)
+        for i in group:
+            pool |= evens[i]
+        found = None
+        for vco in sorted(pool):
+            even = 0
+            for i in group:
+                f = scaled[i][1]
+                if vco in evens[i]:
+                    even += 1
+                elif not 8 * f <= vco <= 900 * f:
+                    break
+            else:
+                score = (even, vco in xtal, vco)
+                if found is None or score[:2] > found[:2]:
+                    found = score
+        return found
+
+    plan, groups = None, {}
+    for mask in range(1 << max(len(used) - 1, 0)):
+        split = ([], [])
+        for n in range(len(used)):
+            split[n > 0 and (mask >> (n - 1)) & 1].append(used[n])
+        even, plls, integer, vco = 0, 0, 0, [0, 0]
+        for pll in (SI5351_I2C.PLL_A, SI5351_I2C.PLL_B):
+            if not split[pll]:
+                continue
+            key = tuple(split[pll])
+            if key not in groups:
+                groups[key] = best(split[pll])
+            if groups[key] is None:
+                break
+            even += groups[key][0]
+            integer += groups[key][1]
+            plls += 1
+            vco[pll] = groups[key][2]
+        else:
+            # most integer mode outputs, then fewest PLLs, then integer PLLs
+            score = (even, -plls, integer)
+            if plan is None or score > plan[0]:
+                plan = (score, vco, split)
+    if plan is None:
+        raise ValueError("no valid plan")
+
+    score, vco, split = plan
+    outputs = [None] * len(freqs)
+    for pll in (SI5351_I2C.PLL_A, SI5351_I2C.PLL_B):
+        for i in split[pll]:
+            r_div, f = scaled[i]
+            div, num, denom = divider(vco[pll], f)
+            outputs[i] = (pll, div, num, denom, r_div)
+    return vco, outputs
+
+
+def vcoFraction(crystalFreq, mult, num, denom):
+    # The exact VCO frequency crystalFreq * (mult + num / denom) as a
+    # reduced fraction of Hz, (numerator, denominator).
+    n, d = crystalFreq * (mult * denom + num), denom
+    a, b = n, d
+    while b:
+        a, b = b, a % b
+    return n // a, d // a
+
+
+def clockControl(pll, integer):
+    # Configure the clk control and enable the output
+    # 8mA drive strength, MS0 as CLK0 source, Clock not inverted, powered up
+    clkControlReg = 0x0F
+    if pll == SI5351_I2C.PLL_B: clkControlReg |= (1 << 5)   # Uses PLLB
+    if integer: clkControlReg |= (1 << 6)                   # Integer mode
+    return clkControlReg
+
+
+class LockError(OSError):
+    # a PLL did not lock in time or the crystal signal is lost
+    pass
+
+
+class ChannelTable:
+    # Channel tuning from a table file compiled by si5351table.py.  The
+    # file stays on disk: tuning a channel seeks to its record, reads
+    # the 9 bytes into a preallocated buffer and writes them in one
+    # burst per changed register range.  Opening the table sets up the
+    # PLL it was compiled for unless it already runs at that VCO.
+
+    def __init__(self, si, f, output=0):
+        import struct
+        magic, pll, mult, num, denom, crystalFreq, count = struct.unpack(
+            SI5351_TABLE_HEADER, f.read(SI5351_TABLE_HEADER_SIZE))
+        if magic != SI5351_TABLE_MAGIC:
+            raise ValueError("not a channel table")
+        if crystalFreq != si.crystalFreq:
+            raise ValueError("table compiled for another crystal")
+        self.si     = si
+        self.f      = f
+        self.output = output
+        self.pll    = pll
+        self.count  = count
+        if vcoFraction(crystalFreq, mult, num, denom) != si._vco[pll]:
+            si.setupPLL(pll, mult, num, denom)
+        self._rec   = bytearray(SI5351_TABLE_RECORD_SIZE)
+        self._block = memoryview(self._rec)[:8]
+        self._ctrl  = memoryview(self._rec)[8:]
+
+
+    def __len__(self):
+        return self.count
+
+
+    def tune(self, index):
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        self.f.seek(SI5351_TABLE_HEADER_SIZE + SI5351_TABLE_RECORD_SIZE * index)
+        self.f.readinto(self._rec)
+        self.si._stage(SI5351_REGISTER_42_MULTISYNTH0_PARAMETERS_1 + 8 * self.output, self._block)
+        self.si._stage(SI5351_REGISTER_16_CLK0_CONTROL + self.output, self._ctrl)
+        self.si._flush()
+
 
 class SI5351_I2C:
 
@@ -48,37 +357,437 @@ class SI5351_I2C:
     R_DIV_128 = 7
 
 
+    def _transfer(self, register, data):
+        # Put a run of consecutive registers on the bus.  The chip
+        # auto-increments the register address after every byte, so the
+        # whole run goes out as a single I2C transaction.  With burst
+        # disabled fall back to one transaction per register.
+        if self.burst:
+            self.i2c.writeto_mem(self.address, register, data)
+        else:
+            for i in range(len(data)):
+                self.i2c.writeto_mem(self.address, register + i, data[i:i+1])
+
+
+    @micropython.native
+    def _stage(self, register, data):
+        # Copy data into the register shadow, marking only the bytes
+        # that differ from what the device is known to hold as dirty.
+        # The PLL reset register self-clears so it is always dirty, and
+        # resets staged before a flush add up.
+        regs, known, dirty = self._regs, self._known, self._dirty
+        for i in range(len(data)):
+            r = register + i
+            v = data[i]
+            if r == SI5351_REGISTER_177_PLL_RESET and dirty[r]:
+                v |= regs[r]
+            if regs[r] != v or not known[r] or r == SI5351_REGISTER_177_PLL_RESET:
+                regs[r] = v
+                dirty[r] = 1
+                if r < self._lo: self._lo = r
+                if r > self._hi: self._hi = r
+
+
+    @micropython.native
+    def _flush(self):
+        # Write every dirty byte range from the shadow to the device,
+        # joining ranges separated by at most SI5351_BURST_GAP clean
+        # known bytes into one burst since resending a couple of bytes is
+        # cheaper than the start, address and register byte of a new
+        # transaction.  Inside a transaction nothing is written until
+        # commit().
+        if self._depth:
+            return
+        regs, known, dirty = self._regs, self._known, self._dirty
+        gap = SI5351_BURST_GAP if self.burst else 0
+        r, hi = self._lo, self._hi
+        while r <= hi:
+            if not dirty[r]:
+                r += 1
+                continue
+            start = end = r
+            r += 1
+            while r <= hi and r - end <= gap + 1:
+                if dirty[r]: end = r
+                elif not known[r]: break    # never resend unknown bytes
+                r += 1
+            n = end + 1 - start
+            if n < len(self._bufs):
+                buf = self._bufs[n]
+                for i in range(n):
+                    buf[i] = regs[start + i]
+            else:
+                buf = self._mv[start:end + 1]
+            self._transfer(start, buf)
+            for i in range(start, end + 1):
+                dirty[i] = 0
+                known[i] = 1
+            r = end + 1
+        known[SI5351_REGISTER_177_PLL_RESET] = 0
+        self._lo, self._hi = SI5351_REGISTER_COUNT, -1
+        if self._busFlush is not None:
+            self._busFlush()
+
+
+    def _write(self, register, data):
+        # Write precompiled bytes straight to the bus, bypassing the
+        # shadow compare, and record them in the shadow.  Inside a
+        # transaction they are staged like any other write instead.
+        if self._depth:
+            self._stage(register, data)
+            return
+        self._transfer(register, data)
+        if self._busFlush is not None:
+            self._busFlush()
+        for i in range(len(data)):
+            self._regs[register + i] = data[i]
+            self._known[register + i] = 1
+
+
     def write8(self, register, value):
-        self.i2c.writeto_mem(self.address, register, bytes([value]))
+        self._one[0] = value
+        self.writeBlock(register, self._one)
+
+
+    def writeBlock(self, register, data):
+        # Write a run of consecutive registers starting at register.
+        # Only bytes that differ from the register shadow go on the bus.
+        self._stage(register, data)
+        self._flush()
+
+
+    def transaction(self):
+        # Batch the writes of several driver calls, e.g.
+        #     with si.transaction():
+        #         si.setupPLL(si.PLL_A, 36)
+        #         si.setupMultisynth(0, si.PLL_A, 100)
+        #         si.setupRdiv(0, si.R_DIV_4)
+        #         si.enableOutputs(True)
+        # Writes are only staged in the register shadow until the
+        # outermost transaction ends, then go out as in commit().  An
+        # exception inside the with block abort()s instead.
+        return self
+
+
+    def __enter__(self):
+        self.begin()
+        return self
+
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+
+    def begin(self):
+        # Start holding back writes until the matching commit().
+        # Transactions nest, only the outermost commit writes.
+        if not self._depth:
+            r = SI5351_REGISTER_3_OUTPUT_ENABLE_CONTROL
+            self._saved = (self._regs[r] if self._known[r] else None,
+                           self.plla_freq, self.pllb_freq, list(self._pllMult),
+                           list(self._vco))
+        self._depth += 1
+
+
+    def commit(self):
+        # Write everything staged since begin() in the fewest bursts, in
+        # the order the datasheet asks for: outputs being turned off are
+        # disabled first, then the configuration registers are written
+        # in ascending bursts, then the PLLs are reset, and the outputs
+        # being turned on are enabled last.
+        if not self._depth:
+            raise RuntimeError("commit without begin")
+        self._depth -= 1
+        if self._depth:
+            return
+        regs, dirty = self._regs, self._dirty
+        R3, R177 = SI5351_REGISTER_3_OUTPUT_ENABLE_CONTROL, SI5351_REGISTER_177_PLL_RESET
+        enable, reset = regs[R3], regs[R177]
+        enabling, resetting = dirty[R3], dirty[R177]
+        dirty[R177] = 0
+        before = self._saved[0]
+        if enabling and before is not None:
+            # CLKx_DIS bits: 1 disables, so first only set new ones
+            regs[R3] = before | enable
+            dirty[R3] = regs[R3] != before
+        self._saved = None
+        self._flush()
+        if resetting:
+            self.write8(R177, reset)
+        if enabling:
+            self.write8(R3, enable)
+
+
+    def abort(self):
+        # Drop everything staged since begin().  The registers concerned
+        # are marked unknown so their next write goes out in any case.
+        if not self._depth:
+            raise RuntimeError("abort without begin")
+        self._depth -= 1
+        if self._depth:
+            return
+        for r in range(SI5351_REGISTER_COUNT):
+            if self._dirty[r]:
+                self._dirty[r] = 0
+                self._known[r] = 0
+        self._lo, self._hi = SI5351_REGISTER_COUNT, -1
+        enable, plla, pllb, mult, vco = self._saved
+        self._saved = None
+        if enable is not None:
+            self._regs[SI5351_REGISTER_3_OUTPUT_ENABLE_CONTROL] = enable
+            self._known[SI5351_REGISTER_3_OUTPUT_ENABLE_CONTROL] = 1
+        for pll in (self.PLL_A, self.PLL_B):
+            if vco[pll] != self._vco[pll]: self._tune[pll].clear()
+        self.plla_freq, self.pllb_freq, self._pllMult, self._vco = plla, pllb, mult, vco
+
+
+    def read8(self, register):
+        self.i2c.readfrom_mem_into(self.address, register, self._stat)
+        return self._stat[0]
+
+
+    def readBlock(self, register, count):
+        # Read count consecutive registers in one burst.
+        return self.i2c.readfrom_mem(self.address, register, count)
+
+
+    def status(self):
+        # the device status register, see the SI5351_STATUS_ bits
+        return self.read8(SI5351_REGISTER_0_DEVICE_STATUS)
+
+
+    def wait_lock(self, pll=None, timeout_us=10000):
+        # Poll the status register until the device is initialized and
+        # pll (both PLLs if None) is locked, and return how long that
+        # took in us.  Call it right after the write that reset the PLL
+        # instead of sleeping for the worst case lock time.  Raises
+        # LockError if the crystal signal is lost or the PLL is not
+        # locked within timeout_us; with timeout_us=0 it only checks
+        # that the PLL is still locked.
+        mask = SI5351_STATUS_SYS_INIT
+        if pll is None or pll == self.PLL_A: mask |= SI5351_STATUS_LOL_A
+        if pll is None or pll == self.PLL_B: mask |= SI5351_STATUS_LOL_B
+        start = ticks_us()
+        while True:
+            status = self.status()
+            elapsed = ticks_diff(ticks_us(), start)
+            if not status & SI5351_STATUS_SYS_INIT and status & SI5351_STATUS_LOS_XTAL:
+                raise LockError("crystal signal lost")
+            if not status & mask:
+                return elapsed
+            if elapsed >= timeout_us:
+                raise LockError("PLL not locked, status 0x{:02x}".format(status))
+
+
+    def invalidate(self):
+        # Forget what the device holds, so the next write of every
+        # register goes on the bus whether it changed or not.
+        for i in range(SI5351_REGISTER_COUNT):
+            self._known[i] = 0
+
+
+    def resync(self):
+        # Repopulate the register shadow from the device with a single
+        # burst read, for example after a power glitch.
+        self.i2c.readfrom_mem_into(self.address, 0, self._regs)
+        for i in range(SI5351_REGISTER_COUNT):
+            self._known[i] = 1
+            self._dirty[i] = 0
+        self._known[SI5351_REGISTER_177_PLL_RESET] = 0
+        self._lo, self._hi = SI5351_REGISTER_COUNT, -1
 
 
     def __init__(self, i2c, 
                  address=SI5351_I2C_ADDRESS_DEFAULT,
-                 crystalFreq=SI5351_CRYSTAL_FREQ_25MHZ):
+                 crystalFreq=SI5351_CRYSTAL_FREQ_25MHZ,
+                 burst=True,
+                 cacheSize=32,
+                 image=None):
         load = SI5351_CRYSTAL_LOAD_10PF
         self.plla_freq   = 0
         self.pllb_freq   = 0
+        self._pllMult    = [0, 0]
+        self._vco        = [(0, 1), (0, 1)]  # exact VCO per PLL, see vcoFraction
+        self._steered    = bytearray(8)  # integer divider of outputs tuned by their PLL
         self.address     = address
         self.i2c         = i2c
         self.crystalFreq = crystalFreq
+        self.burst       = burst
+        self.cacheSize   = cacheSize
+
+        # bus adapters that queue writes (see si5351linux.py) have a
+        # flush() that puts the queue on the bus, called after every
+        # batch of bursts
+        self._busFlush   = getattr(i2c, "flush", None)
+
+        # per PLL tuning cache,
+        # frequency -> [last use, MS block, clk control, achieved frequency]
+        # and the entry set_freq works in when the cache is off
+        self._tune = ({}, {})
+        self._tick = 0
+        self._miss = [0, bytearray(8), bytearray(1), 0]
+
+        # register shadow, what is known of it and what is yet to be written
+        self._regs  = bytearray(SI5351_REGISTER_COUNT)
+        self._mv    = memoryview(self._regs)
+        self._known = bytearray(SI5351_REGISTER_COUNT)
+        self._dirty = bytearray(SI5351_REGISTER_COUNT)
+        self._lo, self._hi = SI5351_REGISTER_COUNT, -1
+
+        # preallocated buffers so tuning does not churn the heap
+        self._block = bytearray(8)
+        self._one   = bytearray(1)
+        self._stat  = bytearray(1)
+        self._bufs  = [bytearray(n) for n in range(17)]
+
+        # opt-in instrumentation, see instrument()
+        self._stats = None
+
+        # transaction nesting depth and what to restore on abort()
+        self._depth = 0
+        self._saved = None
+
+        # start from a saved configuration if there is one
+        if image is not None:
+            self.load_image(image)
+            return
 
         # disable all outputs setting CLKx_DIS high
         self.write8(SI5351_REGISTER_3_OUTPUT_ENABLE_CONTROL, 0xFF)
 
-        # power down all output drivers
-        self.write8(SI5351_REGISTER_16_CLK0_CONTROL, 0x80)
-        self.write8(SI5351_REGISTER_17_CLK1_CONTROL, 0x80)
-        self.write8(SI5351_REGISTER_18_CLK2_CONTROL, 0x80)
-        self.write8(SI5351_REGISTER_19_CLK3_CONTROL, 0x80)
-        self.write8(SI5351_REGISTER_20_CLK4_CONTROL, 0x80)
-        self.write8(SI5351_REGISTER_21_CLK5_CONTROL, 0x80)
-        self.write8(SI5351_REGISTER_22_CLK6_CONTROL, 0x80)
-        self.write8(SI5351_REGISTER_23_CLK7_CONTROL, 0x80)
+        # power down all output drivers (CLK0..CLK7 control registers)
+        self.writeBlock(SI5351_REGISTER_16_CLK0_CONTROL, bytes([0x80] * 8))
 
         # set the load capacitance for the XTAL
         self.write8(SI5351_REGISTER_183_CRYSTAL_INTERNAL_LOAD_CAPACITANCE, load)
 
 
+    def instrument(self, enabled=True, trace=None):
+        # Turn the instrumentation of si5351stats on or off.  While on,
+        # bus transactions, bytes and errors, tuning cache hits and the
+        # time spent per method are counted for stats(), and trace, if
+        # given, is called as trace(ticks_us, register, data) for every
+        # register write (copy data to keep it, the buffer is reused).
+        # While off the driver runs uninstrumented.
+        if enabled and self._stats is None:
+            from si5351stats import Instrumentation
+            self._stats = Instrumentation(self)
+            self._stats.enable()
+        elif not enabled and self._stats is not None:
+            self._stats.disable()
+            self._stats = None
+        if trace is not None and self._stats is not None:
+            self._stats.hooks.append(trace)
+
+
+    def stats(self):
+        return self._stats.stats() if self._stats is not None else {}
+
+
+    def reset_stats(self):
+        if self._stats is not None:
+            self._stats.reset()
+
+
+    def export_image(self):
+        # Return the current configuration as a compact register image
+        # for load_image: the SI5351_IMAGE_MAGIC header followed by
+        # records of a start register, a count and that many register
+        # values, one per range of SI5351_IMAGE_RANGES.  Registers there
+        # the shadow does not know, e.g. after invalidate() or abort(),
+        # are read back from the device first so the image is complete.
+        if self._depth:
+            raise RuntimeError("export_image inside a transaction")
+        known = self._known
+        image = bytearray(SI5351_IMAGE_MAGIC)
+        for start, stop in SI5351_IMAGE_RANGES:
+            r = start
+            while r < stop:
+                if known[r]:
+                    r += 1
+                    continue
+                end = r
+                while end < stop and not known[end]:
+                    end += 1
+                self.i2c.readfrom_mem_into(self.address, r, self._mv[r:end])
+                for i in range(r, end):
+                    known[i] = 1
+                r = end
+            image.append(start)
+            image.append(stop - start)
+            image.extend(self._regs[start:stop])
+        return bytes(image)
+
+
+    def _checkImage(self, image):
+        # Reject images that are truncated, reach outside the
+        # configuration registers or hold only part of a PLL or
+        # multisynth parameter block, which would leave the shadow and
+        # the device with a mix of two configurations.
+        if image[:2] != SI5351_IMAGE_MAGIC:
+            raise ValueError("not a register image")
+        present = bytearray(SI5351_REGISTER_COUNT)
+        i = 2
+        while i < len(image):
+            if i + 2 > len(image):
+                raise ValueError("truncated register image")
+            register, count = image[i], image[i + 1]
+            if i + 2 + count > len(image):
+                raise ValueError("truncated register image")
+            for start, stop in SI5351_IMAGE_RANGES:
+                if start <= register and register + count <= stop:
+                    break
+            else:
+                raise ValueError("register {} not in an image range".format(register))
+            for r in range(register, register + count):
+                present[r] = 1
+            i += 2 + count
+        for base in range(26, SI5351_REGISTER_42_MULTISYNTH0_PARAMETERS_1 + 6 * 8, 8):
+            if 0 < sum(present[base:base + 8]) < 8:
+                raise ValueError("partial parameter block at register {}".format(base))
+
+
+    def load_image(self, image):
+        # Apply a register image from export_image, in the order the
+        # datasheet asks for: outputs disabled, then the configuration
+        # in as few bursts as possible, then a reset of both PLLs and
+        # finally the output enables saved in the image.
+        self._checkImage(image)
+        enable = 0xFF
+        self.write8(SI5351_REGISTER_3_OUTPUT_ENABLE_CONTROL, 0xFF)
+        i = 2
+        while i < len(image):
+            register, count = image[i], image[i + 1]
+            data = image[i + 2:i + 2 + count]
+            if register == SI5351_REGISTER_3_OUTPUT_ENABLE_CONTROL and count:
+                enable = data[0]
+                register, data = register + 1, data[1:]
+            self._stage(register, data)
+            i += 2 + count
+        self._flush()
+        for pll in (self.PLL_A, self.PLL_B):
+            self._loadPLL(pll)
+        self.write8(SI5351_REGISTER_177_PLL_RESET, (1<<7) | (1<<5))
+        self.write8(SI5351_REGISTER_3_OUTPUT_ENABLE_CONTROL, enable)
+
+
+    def _loadPLL(self, pll):
+        # Recover the PLL settings from its parameter registers in the
+        # shadow, as 128 * (mult + num / denom) = P1 + 512 + P2 / P3
+        r = self._regs
+        baseaddr = 26 if pll == self.PLL_A else 34
+        P3 = (r[baseaddr + 5] & 0xF0) << 12 | r[baseaddr] << 8 | r[baseaddr + 1]
+        P1 = (r[baseaddr + 2] & 0x03) << 16 | r[baseaddr + 3] << 8 | r[baseaddr + 4]
+        P2 = (r[baseaddr + 5] & 0x0F) << 16 | r[baseaddr + 6] << 8 | r[baseaddr + 7]
+        if P3 == 0:
+            return
+        x = (P1 + 512) * P3 + P2
+        self._storePLL(pll, x // (128 * P3), x % (128 * P3), 128 * P3)
+
+
     def setupPLL(self, pll, mult, num=0, denom=1):
         # @brief  Sets the multiplier for the specified PLL
         # @param  pll   The PLL to configure, which must be one of the following:
@@ -106,36 +815,48 @@ class SI5351_I2C:
         # P2[19:0] = 128 * num - denom * floor(128*(num/denom))
         # P3[19:0] = denom
 
-        # Set the main PLL config registers
-        P1 = 128 * mult + int(128.0 * num / denom) - 512
-        P2 = 128 * num - denom * int(128.0 * num / denom)
-        P3 = denom
-
         # Get the appropriate starting point for the PLL registers
         baseaddr = 26 if pll == self.PLL_A else 34
 
         # The datasheet is a nightmare of typos and inconsistencies here!
-        self.write8(baseaddr,     (P3 & 0x0000FF00) >> 8)
-        self.write8(baseaddr + 1, (P3 & 0x000000FF))
-        self.write8(baseaddr + 2, (P1 & 0x00030000) >> 16)
-        self.write8(baseaddr + 3, (P1 & 0x0000FF00) >> 8)
-        self.write8(baseaddr + 4, (P1 & 0x000000FF))
-        self.write8(baseaddr + 5, ((P3 & 0x000F0000) >> 12) | ((P2 & 0x000F0000) >> 16) )
-        self.write8(baseaddr + 6, (P2 & 0x0000FF00) >> 8)
-        self.write8(baseaddr + 7, (P2 & 0x000000FF))
+        self.writeBlock(baseaddr, packParameters(self._block, mult, num, denom))
 
         # Reset both PLLs
         self.write8(SI5351_REGISTER_177_PLL_RESET, (1<<7) | (1<<5))
+        self._storePLL(pll, mult, num, denom)
 
-        # Store the frequency settings for use with the Multisynth helper
-        fvco = int(self.crystalFreq * (mult + float(num) / denom))
+
+    def _storePLL(self, pll, mult, num, denom):
+        # Store the frequency settings for use with the Multisynth helper.
+        # The VCO is kept exactly as a fraction for the divider math,
+        # and rounded down to Hz in plla_freq/pllb_freq.
+        vco = vcoFraction(self.crystalFreq, mult, num, denom)
+        self._pllMult[pll] = mult
+        if vco != self._vco[pll]: self._tune[pll].clear()
+        self._vco[pll] = vco
         if pll == self.PLL_A:
-            self.plla_freq = fvco
+            self.plla_freq = vco[0] // vco[1]
         else:
-            self.pllb_freq = fvco
+            self.pllb_freq = vco[0] // vco[1]
 
 
-    def setupMultisynth(self, output, pll, div, num=0, denom=1):
+    def retune_pll(self, pll, mult, num=0, denom=1):
+        # Change the multiplier of a running PLL (see setupPLL) with
+        # as little disturbance as possible.  When the integer part
+        # mult is unchanged only the fractional feedback bytes that
+        # differ are written and the PLL is not reset, so its outputs
+        # keep running.  Otherwise only this PLL is reset (bit 5 for
+        # PLL A, bit 7 for PLL B) and the other PLL is left alone.
+        baseaddr = 26 if pll == self.PLL_A else 34
+        self._stage(baseaddr, packParameters(self._block, mult, num, denom))
+        if mult != self._pllMult[pll]:
+            self._one[0] = (1<<5) if pll == self.PLL_A else (1<<7)
+            self._stage(SI5351_REGISTER_177_PLL_RESET, self._one)
+        self._flush()
+        self._storePLL(pll, mult, num, denom)
+
+
+    def setupMultisynth(self, output, pll, div, num=0, denom=1, rdiv=0):
         # @brief  Configures the Multisynth divider, which determines the
         #         output clock frequency based on the specified PLL input.
         # 
@@ -145,10 +866,8 @@ class SI5351_I2C:
         #                   - SI5351_PLL_B
         # @param  div       The integer divider for the Multisynth output.
         #                   If pure integer values are used, this value must
-        #                   be one of:
-        #                   - SI5351_MULTISYNTH_DIV_4
-        #                   - SI5351_MULTISYNTH_DIV_6
-        #                   - SI5351_MULTISYNTH_DIV_8
+        #                   be 4, 6 or an even number from 8 to 900 (4 sets
+        #                   MSx_DIVBY4).
         #                   If fractional output is used, this value must be
         #                   between 8 and 900.
         # @param  num       The 20-bit numerator for fractional output
@@ -156,6 +875,8 @@ class SI5351_I2C:
         # @param  denom     The 20-bit denominator for fractional output
         #                   (1..1,048,575). Set this to '1' or higher to
         #                   avoid divide by zero errors.
+        # @param  rdiv      The R divider (R_DIV_1..R_DIV_128) which shares
+        #                   the third parameter register with P1[17:16].
         # 
         # @section Output Clock Configuration
         # 
@@ -176,11 +897,10 @@ class SI5351_I2C:
         # @note   Try to use integers whenever possible to avoid clock jitter
         # @note   For output frequencies > 150MHz, you must set the divider
         #         to 4 and adjust to PLL to generate the frequency (for example
-        #         a PLL of 640 to generate a 160MHz output clock). This is not
-        #         yet supported in the driver, which limits frequencies to
-        #         500kHz .. 150MHz.
-        # @note   For frequencies below 500kHz (down to 8kHz) Rx_DIV must be
-        #         used, but this isn't currently implemented in the driver.
+        #         a PLL of 640 to generate a 160MHz output clock).  set_freq
+        #         does this by itself above fVCO / 8.
+        # @note   For frequencies below 500kHz (down to 4kHz) Rx_DIV must be
+        #         used, see rdiv and setupRdiv.
         #
         # Output Multisynth Divider Equations
         # where: a = div, b = num and c = denom
@@ -188,32 +908,17 @@ class SI5351_I2C:
         # P2[19:0] = 128 * b - c * floor(128*(b/c))
         # P3[19:0] = c
 
-        # Set the main PLL config registers
-        P1 = 128 * div + int(128.0 * num / denom) - 512
-        P2 = 128 * num - denom * int(128.0 * num / denom)
-        P3 = denom
-
         # Get the appropriate starting point for the PLL registers
         if output == 0: baseaddr = SI5351_REGISTER_42_MULTISYNTH0_PARAMETERS_1
         if output == 1: baseaddr = SI5351_REGISTER_50_MULTISYNTH1_PARAMETERS_1
         if output == 2: baseaddr = SI5351_REGISTER_58_MULTISYNTH2_PARAMETERS_1
 
-        # Set the MSx config registers
-        self.write8(baseaddr,   (P3 & 0x0000FF00) >> 8)
-        self.write8(baseaddr + 1, (P3 & 0x000000FF))
-        self.write8(baseaddr + 2, (P1 & 0x00030000) >> 16)	
-        # ToDo: Add DIVBY4 (>150MHz) and R0 support (<500kHz) later
-        self.write8(baseaddr + 3, (P1 & 0x0000FF00) >> 8)
-        self.write8(baseaddr + 4, (P1 & 0x000000FF))
-        self.write8(baseaddr + 5, ((P3 & 0x000F0000) >> 12) | ((P2 & 0x000F0000) >> 16) )
-        self.write8(baseaddr + 6, (P2 & 0x0000FF00) >> 8)
-        self.write8(baseaddr + 7, (P2 & 0x000000FF))
+        # Set the MSx config registers (packParameters sets DIVBY4 for div 4)
+        self.writeBlock(baseaddr, packParameters(self._block, div, num, denom, rdiv))
+        self._steered[output] = 0
 
         # Configure the clk control and enable the output
-        # 8mA drive strength, MS0 as CLK0 source, Clock not inverted, powered up
-        clkControlReg = 0x0F
-        if pll == self.PLL_B: clkControlReg |= (1 << 5)   # Uses PLLB 
-        if num == 0: clkControlReg |= (1 << 6)            # Integer mode
+        clkControlReg = clockControl(pll, num == 0)
         if output == 0: self.write8(SI5351_REGISTER_16_CLK0_CONTROL, clkControlReg)
         if output == 1: self.write8(SI5351_REGISTER_17_CLK1_CONTROL, clkControlReg)
         if output == 2: self.write8(SI5351_REGISTER_18_CLK2_CONTROL, clkControlReg)
@@ -223,7 +928,8 @@ class SI5351_I2C:
         if output == 0: Rreg = SI5351_REGISTER_44_MULTISYNTH0_PARAMETERS_3
         if output == 1: Rreg = SI5351_REGISTER_52_MULTISYNTH1_PARAMETERS_3
         if output == 2: Rreg = SI5351_REGISTER_60_MULTISYNTH2_PARAMETERS_3
-        return self.write8(Rreg, (div & 0x07) << 4)
+        # keep the DIVBY4 and P1[17:16] bits sharing the register
+        return self.write8(Rreg, (self._regs[Rreg] & 0x0F) | ((div & 0x07) << 4))
 
 
     def enableOutputs(self, enabled):
@@ -232,49 +938,197 @@ class SI5351_I2C:
         self.write8(SI5351_REGISTER_3_OUTPUT_ENABLE_CONTROL, val)
 
 
+    def _tuning(self, pll, freq, block, ctrl):
+        # Pack the multisynth parameter block and clock control byte
+        # that produce freq from the current VCO of pll into the 8 and
+        # 1 byte buffers block and ctrl, and return the frequency
+        # achieved.
+        r_div, freq = rDivider(freq)
+
+        # fit the divider against the exact VCO n / d
+        n, d = self._vco[pll]
+        div, num, denom = divider(n, d * freq)
+        packParameters(block, div, num, denom, r_div)
+        ctrl[0] = clockControl(pll, num == 0)
+        return n * denom / (d * (div * denom + num) << r_div)
+
+
     def set_freq(self, output, pll, freq):
-        r_div = self.R_DIV_1
-        if (freq >= SI5351_CLKOUT_MIN_FREQ and 
-            freq <  SI5351_CLKOUT_MIN_FREQ * 2):
-            r_div = self.R_DIV_128
-            freq *= 128
-        elif (freq >= SI5351_CLKOUT_MIN_FREQ * 2 and 
-              freq <  SI5351_CLKOUT_MIN_FREQ * 4):
-            r_div = self.R_DIV_64
-            freq *= 64
-        elif (freq >= SI5351_CLKOUT_MIN_FREQ * 4 and 
-              freq <  SI5351_CLKOUT_MIN_FREQ * 8):
-            r_div = self.R_DIV_32
-            freq *= 32
-        elif (freq >= SI5351_CLKOUT_MIN_FREQ * 8 and 
-              freq <  SI5351_CLKOUT_MIN_FREQ * 16):
-            r_div = self.R_DIV_16
-            freq *= 16
-        elif (freq >= SI5351_CLKOUT_MIN_FREQ * 16 and
-              freq <  SI5351_CLKOUT_MIN_FREQ * 32):
-            r_div = self.R_DIV_8
-            freq *= 8
-        elif (freq >= SI5351_CLKOUT_MIN_FREQ * 32 and
-              freq <  SI5351_CLKOUT_MIN_FREQ * 64):
-            r_div = self.R_DIV_4
-            freq *= 4
-        elif (freq >= SI5351_CLKOUT_MIN_FREQ * 64 and
-              freq <  SI5351_CLKOUT_MIN_FREQ * 128):
-            r_div = self.R_DIV_2
-            freq *= 2
+        # Returns the frequency actually produced, which differs from
+        # freq when the divider needs a fraction finer than 20 bits.
+        # Tuning results are remembered per PLL in a small LRU cache
+        # so revisiting a frequency skips the divider math entirely.
+        # The cache of a PLL is dropped whenever its VCO changes.
+        # Above fVCO / 8 the multisynth cannot reach freq from the VCO
+        # any more, and the PLL is tuned instead (see _steer).
+        fvco = self.plla_freq if pll == self.PLL_A else self.pllb_freq
+        if freq << 3 > fvco:
+            return self._steer(output, pll, freq)
+        self._steered[output] = 0
+        cache = self._tune[pll]
+        entry = cache.get(freq)
+        if entry is None:
+            # a miss takes over the buffers of the entry it evicts, so
+            # only filling the cache allocates
+            if self.cacheSize <= 0:
+                entry = self._miss
+            elif len(cache) >= self.cacheSize:
+                oldest = None
+                for key in cache:
+                    if oldest is None or cache[key][0] < cache[oldest][0]:
+                        oldest = key
+                entry = cache.pop(oldest)
+            else:
+                entry = [0, bytearray(8), bytearray(1), 0]
+            entry[3] = self._tuning(pll, freq, entry[1], entry[2])
+            if self.cacheSize > 0:
+                cache[freq] = entry
+        self._tick += 1
+        entry[0] = self._tick
+        self._stage(SI5351_REGISTER_42_MULTISYNTH0_PARAMETERS_1 + 8 * output, entry[1])
+        self._stage(SI5351_REGISTER_16_CLK0_CONTROL + output, entry[2])
+        self._flush()
+        return entry[3]
 
-        if pll == self.PLL_A:
-            fvco = self.plla_freq
+
+    def _steer(self, output, pll, freq):
+        # Tune output to freq (up to 200MHz) by moving the PLL behind an
+        # even integer multisynth divider, 4 (DIVBY4), 6 or 8.  Raises
+        # ValueError if any other output is powered up on that PLL.
+        # Once the output is set up a step that keeps the divider only
+        # writes the changed bytes of the 8 byte PLL block, and resets
+        # the PLL only when the integer part of its multiplier changes.
+        if freq > SI5351_CLKOUT_MAX_FREQ:
+            raise ValueError("frequency out of range")
+        # the output needs the PLL to itself, as moving the VCO would
+        # move every other powered up output running from it
+        regs, known = self._regs, self._known
+        for n in range(8):
+            r = SI5351_REGISTER_16_CLK0_CONTROL + n
+            if n != output and (not known[r] or
+                                not regs[r] & 0x80 and (regs[r] >> 5) & 1 == pll):
+                raise ValueError("PLL in use by CLK{}".format(n))
+        div = self._steered[output]
+        if not div or not SI5351_VCO_MIN_FREQ <= div * freq <= SI5351_VCO_MAX_FREQ:
+            div = 0
+            for n in (8, 6, 4):
+                if SI5351_VCO_MIN_FREQ <= n * freq <= SI5351_VCO_MAX_FREQ:
+                    div = n
+                    break
+            if not div:
+                raise ValueError("frequency out of range")
+        mult, num, denom = divider(div * freq, self.crystalFreq)
+        if div == self._steered[output] and self._isSteered(output, pll, div):
+            self.retune_pll(pll, mult, num, denom)
         else:
-            fvco = self.pllb_freq
+            self._stage(26 if pll == self.PLL_A else 34,
+                        packParameters(self._block, mult, num, denom))
+            self._stage(SI5351_REGISTER_42_MULTISYNTH0_PARAMETERS_1 + 8 * output,
+                        packParameters(self._block, div, 0, 1))
+            self._one[0] = clockControl(pll, True)
+            self._stage(SI5351_REGISTER_16_CLK0_CONTROL + output, self._one)
+            self._one[0] = (1<<5) if pll == self.PLL_A else (1<<7)
+            self._stage(SI5351_REGISTER_177_PLL_RESET, self._one)
+            self._flush()
+            self._storePLL(pll, mult, num, denom)
+            self._steered[output] = div
+        return self.crystalFreq * (mult * denom + num) / denom / div
+
+
+    def _isSteered(self, output, pll, div):
+        # Whether the shadow still holds output as _steer left it, an
+        # integer divider div from pll.  Anything writing the multisynth
+        # block or clock control since (set_freqs, a sweep, keyer, table
+        # or image, an aborted transaction) makes _steer set it up anew.
+        regs, known = self._regs, self._known
+        r = SI5351_REGISTER_16_CLK0_CONTROL + output
+        if not known[r] or regs[r] != clockControl(pll, True):
+            return False
+        block = packParameters(self._block, div, 0, 1)
+        r = SI5351_REGISTER_42_MULTISYNTH0_PARAMETERS_1 + 8 * output
+        for i in range(8):
+            if not known[r + i] or regs[r + i] != block[i]:
+                return False
+        return True
+
+
+    def set_freqs(self, freqs):
+        # Program all outputs at once from a frequency plan (see
+        # planFrequencies), choosing the VCO of both PLLs and which
+        # output runs from which.  Everything is staged first and then
+        # written in a few bursts followed by a reset of the PLLs used.
+        # Returns the achieved frequency per output (None if unused).
+        vco, outputs = planFrequencies(freqs, self.crystalFreq)
+        reset = 0
+        for pll in (self.PLL_A, self.PLL_B):
+            if vco[pll]:
+                mult, num, denom = divider(vco[pll], self.crystalFreq)
+                self._stage(26 if pll == self.PLL_A else 34,
+                            packParameters(self._block, mult, num, denom))
+                self._storePLL(pll, mult, num, denom)
+                reset |= (1<<5) if pll == self.PLL_A else (1<<7)
+        achieved = []
+        for output in range(len(outputs)):
+            if outputs[output] is None:
+                achieved.append(None)
+                continue
+            pll, div, num, denom, r_div = outputs[output]
+            self._stage(SI5351_REGISTER_42_MULTISYNTH0_PARAMETERS_1 + 8 * output,
+                        packParameters(self._block, div, num, denom, r_div))
+            self._one[0] = clockControl(pll, num == 0)
+            self._stage(SI5351_REGISTER_16_CLK0_CONTROL + output, self._one)
+            n, d = self._vco[pll]
+            achieved.append(n * denom / (d * (div * denom + num) << r_div))
+        self._one[0] = reset
+        self._stage(SI5351_REGISTER_177_PLL_RESET, self._one)
+        self._flush()
+        return achieved
+
+
+    def sweep(self, output, pll, start, stop=None, step=None, dwell_us=1000, callback=None):
+        # Return a sweep of output from start to stop in step Hz, or
+        # over the frequencies start yields if stop is None, that writes
+        # a new frequency every dwell_us.  See si5351sweep.Sweep, e.g.
+        #     stats = si.sweep(0, si.PLL_A, 7000000, 7200000, 100).run()
+        from si5351sweep import Sweep, frange
+        freqs = start if stop is None else frange(start, stop, step)
+        return Sweep(self, output, pll, freqs, dwell_us, callback)
 
-        div = fvco // freq
-        num = fvco % freq
-        denom = freq
-        while denom > SI5351_MULTISYNTH_C_MAX:
-           num //= 2
-           denom //= 2
 
-        self.setupMultisynth(output, pll, div, num, denom)
-        self.setupRdiv(output, r_div)
+    def quadrature(self, pll=PLL_A, outputs=(0, 1)):
+        # Return an I/Q pair on outputs (I, then Q lagging by 90 degrees)
+        # running from pll.  See si5351iq.Quadrature, e.g.
+        #     iq = si.quadrature()
+        #     iq.set_freq(7074000)
+        from si5351iq import Quadrature
+        return Quadrature(self, pll, outputs)
+
+
+    def keyer(self, output, pll, base, spacing, tones, hook=None):
+        # Return a keyer that shifts output between tones base + k *
+        # spacing Hz with one short burst per symbol.  See
+        # si5351keying.Keyer, e.g. for WSPR on 30m
+        #     si.keyer(0, si.PLL_A, 10140100, (375, 256), 4).send(symbols, 682667)
+        from si5351keying import Keyer
+        return Keyer(self, output, pll, base, spacing, tones, hook)
+
+
+    def open_table(self, f, output=0):
+        # Return a ChannelTable tuning output from the channel table
+        # file f (opened "rb"), e.g.
+        #     channels = si.open_table(open("40m.tbl", "rb"))
+        #     channels.tune(1234)
+        return ChannelTable(self, f, output)
+
+
+    def set_vco(self, pll, fvco, fast=False):
+        # Set the PLL to the VCO frequency closest to fvco (600..900MHz)
+        # the feedback multisynth fraction can reach and return it.
+        # With fast set the PLL is changed through retune_pll.
+        mult, num, denom = divider(fvco, self.crystalFreq)
+        if fast:
+            self.retune_pll(pll, mult, num, denom)
+        else:
+            self.setupPLL(pll, mult, num, denom)
+        return self.crystalFreq * (mult * denom + num) / denom
 
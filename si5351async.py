@@ -0,0 +1,99 @@
+
+# asyncio front end for SI5351_I2C with latest-wins tuning.
+#
+# Each output gets a task that writes its newest requested frequency.
+# Requests made while a write is pending replace it instead of queuing
+# behind it, so a fast spinning knob never plays back stale frequencies.
+# Create it from within a running event loop:
+#
+#     tuner = AsyncSI5351(si)
+#     tuner.tune(0, 7000000)               # returns at once
+#     await tuner.set_freq(0, 7000010)     # returns once written
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+
+class AsyncSI5351:
+
+    def __init__(self, si, outputs=3, pll=0):
+        self.si       = si
+        self.achieved = [None] * outputs    # last achieved frequency
+        self.requests = 0                   # tune calls
+        self.writes   = 0                   # set_freq calls made
+        self.dropped  = 0                   # requests superseded unwritten
+        self._pll     = [pll] * outputs
+        self._pending = [None] * outputs    # frequency waiting to be written
+        self._seq     = [0] * outputs       # last request number
+        self._done    = [0] * outputs       # last request number written
+        self._error   = [None] * outputs
+        self._wake    = [asyncio.Event() for i in range(outputs)]
+        self._written = [asyncio.Event() for i in range(outputs)]
+        self._tasks   = [asyncio.create_task(self._run(i)) for i in range(outputs)]
+
+
+    def tune(self, output, freq, pll=None):
+        # Ask for freq on output without waiting.  Returns the request
+        # number, which wait() takes.
+        if self._pending[output] is not None:
+            self.dropped += 1
+        if pll is not None:
+            self._pll[output] = pll
+        self._pending[output] = freq
+        self._seq[output] += 1
+        self.requests += 1
+        self._wake[output].set()
+        return self._seq[output]
+
+
+    async def wait(self, output, seq=None):
+        # Wait until request seq (default the latest) or a newer one
+        # replacing it has been written, and return the achieved
+        # frequency.  Raises the error of a failed write.
+        if seq is None:
+            seq = self._seq[output]
+        while self._done[output] < seq:
+            await self._written[output].wait()
+        if self._error[output] is not None:
+            raise self._error[output]
+        return self.achieved[output]
+
+
+    async def set_freq(self, output, freq, pll=None):
+        return await self.wait(output, self.tune(output, freq, pll))
+
+
+    def stats(self):
+        return {"requests": self.requests, "writes": self.writes,
+                "dropped": self.dropped}
+
+
+    def close(self):
+        for task in self._tasks:
+            task.cancel()
+
+
+    async def _run(self, output):
+        while True:
+            await self._wake[output].wait()
+            self._wake[output].clear()
+            while self._pending[output] is not None:
+                freq = self._pending[output]
+                seq = self._seq[output]
+                self._pending[output] = None
+                try:
+                    self.achieved[output] = self.si.set_freq(
+                        output, self._pll[output], freq)
+                    self._error[output] = None
+                except Exception as e:
+                    # e.g. OSError from the bus or ValueError for a
+                    # frequency out of range; keep serving the output
+                    self._error[output] = e
+                self.writes += 1
+                self._done[output] = seq
+                self._written[output].set()
+                self._written[output].clear()
+                # let other tasks run, and requests pile up, between writes
+                await asyncio.sleep(0)
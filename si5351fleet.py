@@ -0,0 +1,118 @@
+
+# Programming many SI5351s at once.
+#
+# A Fleet holds SI5351_I2C instances by name, grouped by the I2C bus
+# they sit on.  apply() takes a frequency plan for the whole fleet and
+# programs the buses in parallel while devices on the same bus are
+# programmed one after the other, as they have to be:
+#
+#     fleet = Fleet()
+#     fleet.add("rx", SI5351_I2C(i2c0))
+#     fleet.add("tx", SI5351_I2C(i2c1))
+#     report = fleet.apply({"rx": [7000000, 7000000], "tx": [14000000]})
+#
+# On CPython every bus gets a thread of its own.  On MicroPython the
+# buses are interleaved in one thread: whenever a device is waiting for
+# its PLLs to lock, the other buses are served meanwhile.
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    # MicroPython
+    ThreadPoolExecutor = None
+
+from si5351 import ticks_us, ticks_diff
+from si5351 import LockError, SI5351_REGISTER_16_CLK0_CONTROL
+
+
+class Fleet:
+
+    def __init__(self, threads=True):
+        # threads false interleaves the buses on CPython as well
+        self.devices = {}       # name -> SI5351_I2C
+        self.shared  = {}       # name -> bus given to add(), if any
+        self.threads = threads and ThreadPoolExecutor is not None
+
+
+    def add(self, name, si, bus=None):
+        # bus tells which devices share a bus, by default their i2c
+        self.devices[name] = si
+        self.shared[name] = bus
+
+
+    def buses(self):
+        # the names of the devices per bus.  Looked up at every apply()
+        # as instrument() swaps the i2c of a device for a counting proxy
+        # in front of the same bus.
+        buses = {}
+        for name, si in self.devices.items():
+            bus = self.shared[name]
+            if bus is None:
+                bus = si.i2c if si._stats is None else si._stats._i2c
+            buses.setdefault(id(bus), []).append(name)
+        return buses
+
+
+    def _program(self, name, freqs, lock, timeout_us, report):
+        # Program one device, yielding while its PLLs are locking.
+        si = self.devices[name]
+        start = ticks_us()
+        entry = report[name] = {"us": 0, "achieved": None, "error": None}
+        try:
+            entry["achieved"] = si.set_freqs(freqs)
+            if lock:
+                # wait for the PLLs the outputs just set up run from
+                plls = set((si._regs[SI5351_REGISTER_16_CLK0_CONTROL + output] >> 5) & 1
+                           for output in range(len(freqs))
+                           if entry["achieved"][output] is not None)
+                for pll in plls:
+                    while True:
+                        try:
+                            si.wait_lock(pll, 0)
+                            break
+                        except LockError:
+                            if ticks_diff(ticks_us(), start) >= timeout_us:
+                                raise
+                        yield
+        except (ValueError, OSError) as e:
+            entry["error"] = e
+        entry["us"] = ticks_diff(ticks_us(), start)
+
+
+    def _bus(self, names, plan, lock, timeout_us, report):
+        # the devices of one bus, one after the other
+        for name in names:
+            if name in plan:
+                for step in self._program(name, plan[name], lock, timeout_us, report):
+                    yield
+
+
+    def apply(self, plan, lock=False, timeout_us=10000):
+        # Program every device named in plan, a dict of name to the
+        # output frequencies for its set_freqs.  With lock set also
+        # wait for their PLLs to lock.  Returns the total time in us and
+        # per device the time in us, the achieved frequencies and the
+        # error (ValueError or OSError) if it failed.
+        report = {}
+        start = ticks_us()
+        buses = [self._bus(names, plan, lock, timeout_us, report)
+                 for names in self.buses().values()]
+        if self.threads and len(buses) > 1:
+            with ThreadPoolExecutor(max_workers=len(buses)) as pool:
+                for done in [pool.submit(self._drain, bus) for bus in buses]:
+                    done.result()
+        else:
+            # round robin over the buses until all are done
+            while buses:
+                for bus in list(buses):
+                    try:
+                        next(bus)
+                    except StopIteration:
+                        buses.remove(bus)
+        return {"total_us": ticks_diff(ticks_us(), start), "devices": report}
+
+
+    @staticmethod
+    def _drain(bus):
+        for step in bus:
+            pass
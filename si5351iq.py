@@ -0,0 +1,155 @@
+
+# Quadrature (I/Q) output pair for SI5351_I2C, see SI5351_I2C.quadrature().
+#
+# Both outputs divide the same PLL by the same even integer N, and the
+# Q output is delayed by N quarter VCO periods through its phase offset
+# register, which is a quarter of the output period: 90 degrees.  The
+# offset only takes effect on a PLL reset, and as it is 7 bits N can be
+# at most 126, so with the VCO at 600..900MHz the pair covers about
+# 4.8MHz to 112MHz.
+#
+# Setting a frequency programs the PLL, both multisynths, their clock
+# controls and phase offsets in ascending bursts, then resets only that
+# PLL.  As long as N stays the same, retuning moves the PLL feedback
+# fraction alone: the multisynths keep dividing the one VCO so the
+# pair stays in quadrature, and only the changed PLL bytes are written.
+
+from si5351 import divider, packParameters, clockControl
+from si5351 import SI5351_VCO_MIN_FREQ, SI5351_VCO_MAX_FREQ, SI5351_PHASE_OFFSET_MAX
+from si5351 import SI5351_MULTISYNTH_C_MAX
+from si5351 import SI5351_REGISTER_16_CLK0_CONTROL, SI5351_REGISTER_42_MULTISYNTH0_PARAMETERS_1
+from si5351 import SI5351_REGISTER_165_CLK0_PHASE_OFFSET, SI5351_REGISTER_177_PLL_RESET
+
+
+def evenDivider(lo, hi):
+    # The largest even integer divider N (8..126) putting every
+    # frequency from lo to hi into the VCO range, or None.
+    n = min(SI5351_VCO_MAX_FREQ // hi, SI5351_PHASE_OFFSET_MAX) & ~1
+    if n < 8 or n * lo < SI5351_VCO_MIN_FREQ:
+        return None
+    return n
+
+
+class Quadrature:
+
+    def __init__(self, si, pll, outputs=(0, 1)):
+        self.si      = si
+        self.pll     = pll
+        self.outputs = outputs
+        self.div     = None             # the even divider N in use
+        self._table  = None
+        self._block  = bytearray(8)
+
+
+    def _pllAddress(self):
+        return 26 if self.pll == self.si.PLL_A else 34
+
+
+    def _program(self, div, mult, num, denom):
+        # Set up the PLL, both multisynths as integer dividers and the
+        # phase offsets, then reset the PLL so the offsets take effect.
+        si = self.si
+        si._stage(self._pllAddress(), packParameters(self._block, mult, num, denom))
+        block = packParameters(bytearray(8), div, 0, 1)
+        phase = 0
+        for output in self.outputs:
+            si._stage(SI5351_REGISTER_42_MULTISYNTH0_PARAMETERS_1 + 8 * output, block)
+            si._one[0] = clockControl(self.pll, True)
+            si._stage(SI5351_REGISTER_16_CLK0_CONTROL + output, si._one)
+            si._one[0] = phase
+            si._stage(SI5351_REGISTER_165_CLK0_PHASE_OFFSET + output, si._one)
+            phase = div
+        si._one[0] = (1<<5) if self.pll == si.PLL_A else (1<<7)
+        si._stage(SI5351_REGISTER_177_PLL_RESET, si._one)
+        si._flush()
+        si._storePLL(self.pll, mult, num, denom)
+        self.div = div
+
+
+    def _intact(self):
+        # Whether the shadow still holds the pair as _program left it:
+        # both outputs integer dividers by N from the PLL, with their
+        # phase offsets.  Anything else writing them since (set_freq,
+        # set_freqs, an image, an aborted transaction) means the pair
+        # has to be set up again before the PLL alone can move it.
+        si = self.si
+        phase = 0
+        for output in self.outputs:
+            r = SI5351_REGISTER_165_CLK0_PHASE_OFFSET + output
+            if (not si._isSteered(output, self.pll, self.div) or
+                    not si._known[r] or si._regs[r] != phase):
+                return False
+            phase = self.div
+        return True
+
+
+    def _achieved(self, mult, num, denom):
+        return self.si.crystalFreq * (mult * denom + num) / denom / self.div
+
+
+    def set_freq(self, freq):
+        # Put the pair on freq and return the frequency achieved.  The
+        # divider is kept if freq fits it, so that only the PLL moves.
+        div = self.div
+        if div is None or not SI5351_VCO_MIN_FREQ <= div * freq <= SI5351_VCO_MAX_FREQ:
+            div = evenDivider(freq, freq)
+            if div is None:
+                raise ValueError("frequency out of the quadrature range")
+        mult, num, denom = divider(div * freq, self.si.crystalFreq)
+        if div != self.div or not self._intact():
+            self._program(div, mult, num, denom)
+        else:
+            self.si.retune_pll(self.pll, mult, num, denom)
+        return self._achieved(mult, num, denom)
+
+
+    def compile(self, freqs):
+        # Precompute the PLL settings for stepping the pair over freqs,
+        # with one divider for all of them, for step().  Returns the
+        # achieved frequencies.
+        div = evenDivider(min(freqs), max(freqs))
+        if div is None:
+            raise ValueError("frequencies span more than one divider")
+        fractions = [divider(div * freq, self.si.crystalFreq) for freq in freqs]
+
+        # bring the fractions onto a common denominator if one fits, so
+        # that P3 stays put and steps only write the P1/P2 bytes
+        common = 1
+        for mult, num, denom in fractions:
+            a, b = common, denom
+            while b:
+                a, b = b, a % b
+            common = common * denom // a
+            if common > SI5351_MULTISYNTH_C_MAX:
+                common = None
+                break
+        table = []
+        achieved = []
+        for mult, num, denom in fractions:
+            if common is not None:
+                num, denom = num * (common // denom), common
+            table.append((mult, num, denom, packParameters(bytearray(8), mult, num, denom)))
+        self._table = table
+        if div != self.div or not self._intact():
+            self._program(div, *table[0][:3])
+        for mult, num, denom, block in table:
+            achieved.append(self._achieved(mult, num, denom))
+        return achieved
+
+
+    def step(self, index):
+        # Move the pair to compiled frequency index: the changed PLL
+        # feedback bytes in one burst, and a reset of the PLL only when
+        # the integer part of the multiplier changes (or the whole pair
+        # again if something else wrote it since).
+        si = self.si
+        mult, num, denom, block = self._table[index]
+        if not self._intact():
+            self._program(self.div, mult, num, denom)
+            return
+        si._stage(self._pllAddress(), block)
+        if mult != si._pllMult[self.pll]:
+            si._one[0] = (1<<5) if self.pll == si.PLL_A else (1<<7)
+            si._stage(SI5351_REGISTER_177_PLL_RESET, si._one)
+        si._flush()
+        si._storePLL(self.pll, mult, num, denom)
@@ -0,0 +1,139 @@
+
+# Symbol keying (FSK) for SI5351_I2C, see SI5351_I2C.keyer().
+#
+# For digital modes like WSPR, FT8 or CW-FSK an output moves between a
+# few tones spaced some Hz apart, at exact symbol boundaries.  The
+# multisynth block of every tone is worked out once up front and only
+# the span of bytes that differs between tones is kept, so keying a
+# symbol is a single burst of a few bytes instead of a set_freq call.
+# Symbols are played from a busy-waiting loop (send), an asyncio task
+# (asend) or a machine.Timer callback (start), see si5351sweep.Player.
+
+from si5351 import rDivider, packParameters, clockControl, SI5351_MULTISYNTH_C_MAX
+from si5351 import SI5351_REGISTER_16_CLK0_CONTROL, SI5351_REGISTER_42_MULTISYNTH0_PARAMETERS_1
+from si5351sweep import Player
+
+
+class Keyer(Player):
+
+    def __init__(self, si, output, pll, base, spacing, tones, hook=None):
+        # Tone k is base + k * spacing Hz.  spacing is an int or a
+        # (num, denom) pair for fractional spacings, e.g. (375, 256) for
+        # the 1.4648Hz of WSPR.  hook(index, symbol, late_us) runs right
+        # after each symbol is written, to measure symbol edge latency.
+        self.si     = si
+        self.output = output
+        self.pll    = pll
+        self.hook   = hook
+        num, denom = spacing if isinstance(spacing, tuple) else (spacing, 1)
+
+        # All tones share the R divider of the base frequency and the
+        # largest fraction denominator, so that P3 stays put and only
+        # the P1/P2 bytes change from tone to tone.
+        r_div = rDivider(base)[0]
+        c = SI5351_MULTISYNTH_C_MAX
+        n, d = si._vco[pll]
+        blocks = []
+        self.achieved = []
+        for k in range(tones):
+            freq = (base * denom + k * num) << r_div
+            div, rem = divmod(n * denom, d * freq)
+            b = (2 * rem * c + d * freq) // (2 * d * freq)
+            if b == c:
+                div, b = div + 1, 0
+            blocks.append(packParameters(bytearray(8), div, b, c, r_div))
+            self.achieved.append(n * c / (d * (div * c + b) << r_div))
+
+        # the span of bytes that differs between any two tones
+        changed = [i for i in range(8) if any(block[i] != blocks[0][i] for block in blocks)]
+        if not changed:
+            raise ValueError("tone spacing below the divider resolution")
+        lo, hi = changed[0], changed[-1]
+        base = self._base = SI5351_REGISTER_42_MULTISYNTH0_PARAMETERS_1 + 8 * output
+        self.register = base + lo
+        self._table = [bytes(block[lo:hi + 1]) for block in blocks]
+
+        # the registers every tone shares, fractional mode whatever the
+        # tone, which keying a symbol relies on the shadow holding
+        self._block = blocks[0]
+        self._fixed = [(base + i, blocks[0][i]) for i in range(8) if not lo <= i <= hi]
+        self._fixed.append((SI5351_REGISTER_16_CLK0_CONTROL + output, clockControl(pll, False)))
+
+        # start on tone 0
+        self._setup(0)
+        self._symbols = None
+        self._index   = 0
+        self._tick_ref = self._tick
+        self.reset_stats()
+
+
+    def _setup(self, symbol):
+        # the whole multisynth block and clock control, on tone symbol
+        si = self.si
+        si._stage(self._base, self._block)
+        si._stage(self.register, self._table[symbol])
+        si._one[0] = clockControl(self.pll, False)
+        si._stage(SI5351_REGISTER_16_CLK0_CONTROL + self.output, si._one)
+        si._flush()
+
+
+    def key(self, symbol):
+        # Switch to tone symbol right away.  Only the bytes that differ
+        # between tones are written, unless anything else wrote the
+        # output since and the shadow no longer holds the layout they
+        # belong in.
+        si = self.si
+        regs, known = si._regs, si._known
+        for register, value in self._fixed:
+            if not known[register] or regs[register] != value:
+                self._setup(symbol)
+                return
+        si._write(self.register, self._table[symbol])
+
+
+    def _more(self):
+        return self._symbols is not None and self._index < len(self._symbols)
+
+
+    def _step(self, index, late):
+        symbol = self._symbols[index]
+        self.key(symbol)
+        if self.hook:
+            self.hook(index, symbol, late)
+
+
+    def _load(self, symbols):
+        self._symbols = symbols
+        self._index = 0
+
+
+    def send(self, symbols, period_us):
+        # Key the symbols, one every period_us, busy-waiting for every
+        # symbol edge.  Returns stats().
+        self._load(symbols)
+        return self._run(period_us)
+
+
+    async def asend(self, symbols, period_us):
+        # Key the symbols from an asyncio task, sleeping between symbol
+        # edges so other tasks run.  Returns stats().
+        self._load(symbols)
+        return await self._arun(period_us)
+
+
+    def start(self, timer, symbols, period_us):
+        # Key the symbols from a machine.Timer, one per period (period_us
+        # rounded to whole ms, 683ms for WSPR).  The first symbol goes
+        # out at once.  done() tells when it is over.
+        self._load(symbols)
+        self._startTimer(timer, period_us)
+
+
+    def stats(self):
+        # symbols written, bytes per symbol and how late symbol edges were
+        return {
+            "symbols": self.played,
+            "bytes_per_symbol": len(self._table[0]),
+            "late_max_us": self.late_max_us,
+            "late_mean_us": self._lateMean(),
+        }
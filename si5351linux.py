@@ -0,0 +1,156 @@
+
+# Linux i2c-dev bus adapter for SI5351_I2C, CPython only.
+#
+# LinuxI2C offers the writeto_mem/readfrom_mem calls of machine.I2C on
+# top of /dev/i2c-N, so the driver runs unchanged on a Raspberry Pi or a
+# test bench PC:
+#
+#     si = SI5351_I2C(LinuxI2C(1))
+#
+# Every transfer is one I2C_RDWR ioctl built in preallocated ctypes
+# message buffers.  A register read is a write of the register address
+# and a read joined by a repeated start in the same ioctl.  Writes are
+# queued and the driver calls flush() after each batch of bursts, so
+# the bursts of a set_freq (multisynth block and clk control) go out as
+# the messages of a single ioctl instead of one syscall each.
+#
+# The ioctl function can be replaced, e.g. by Loopback which plays the
+# messages against a SimI2C, so the adapter is testable without any
+# hardware.
+
+import ctypes
+import os
+
+I2C_RDWR        = 0x0707    # combined transfer, see linux/i2c-dev.h
+I2C_M_RD        = 0x0001    # message is a read
+I2C_RDWR_MAX    = 42        # I2C_RDWR_IOCTL_MAX_MSGS
+I2C_MSG_SIZE    = 257       # register address and a burst of all registers
+
+
+class i2c_msg(ctypes.Structure):
+    _fields_ = [("addr", ctypes.c_uint16),
+                ("flags", ctypes.c_uint16),
+                ("len", ctypes.c_uint16),
+                ("buf", ctypes.POINTER(ctypes.c_uint8))]
+
+
+class i2c_rdwr_ioctl_data(ctypes.Structure):
+    _fields_ = [("msgs", ctypes.POINTER(i2c_msg)),
+                ("nmsgs", ctypes.c_uint32)]
+
+
+class LinuxI2C:
+
+    def __init__(self, bus=1, fd=None, ioctl=None, queue=8):
+        # bus is the N of /dev/i2c-N (or a device path), unless an
+        # already open fd is given.  queue is how many writes are held
+        # back for one ioctl, 1 sends every write at once.
+        if ioctl is None:
+            import fcntl
+            ioctl = fcntl.ioctl
+        if fd is None:
+            path = bus if isinstance(bus, str) else "/dev/i2c-{}".format(bus)
+            fd = os.open(path, os.O_RDWR)
+        self.fd       = fd
+        self.ioctl    = ioctl
+        self.queue    = min(queue, I2C_RDWR_MAX)
+        self.syscalls = 0
+        self._pending = 0
+        self._msgs    = (i2c_msg * I2C_RDWR_MAX)()
+        self._bufs    = [(ctypes.c_uint8 * I2C_MSG_SIZE)() for i in range(I2C_RDWR_MAX)]
+        for msg, buf in zip(self._msgs, self._bufs):
+            msg.buf = buf
+        self._data    = i2c_rdwr_ioctl_data(self._msgs, 0)
+
+
+    def close(self):
+        self.flush()
+        os.close(self.fd)
+
+
+    def _message(self, i, addr, flags, length):
+        msg = self._msgs[i]
+        msg.addr, msg.flags, msg.len = addr, flags, length
+        return self._bufs[i]
+
+
+    def _transfer(self, nmsgs):
+        self._data.nmsgs = nmsgs
+        self.syscalls += 1
+        self.ioctl(self.fd, I2C_RDWR, self._data)
+
+
+    def writeto_mem(self, addr, memaddr, buf, addrsize=8):
+        n = len(buf)
+        if n + 1 > I2C_MSG_SIZE:
+            raise ValueError("burst too long")
+        if self._pending >= self.queue:
+            self.flush()
+        msgbuf = self._message(self._pending, addr, 0, n + 1)
+        msgbuf[0] = memaddr
+        ctypes.memmove(ctypes.byref(msgbuf, 1), bytes(buf), n)
+        self._pending += 1
+        if self._pending >= self.queue:
+            self.flush()
+
+
+    def writeto(self, addr, buf, stop=True):
+        self.writeto_mem(addr, buf[0], buf[1:])
+        return len(buf)
+
+
+    def flush(self):
+        # put the queued writes on the bus as one ioctl
+        if self._pending:
+            nmsgs, self._pending = self._pending, 0
+            self._transfer(nmsgs)
+
+
+    def readfrom_mem_into(self, addr, memaddr, buf, addrsize=8):
+        # register address write and read in one ioctl, after any
+        # queued writes so the order on the bus is kept
+        n = len(buf)
+        if self._pending + 2 > I2C_RDWR_MAX:
+            self.flush()
+        i = self._pending
+        self._message(i, addr, 0, 1)[0] = memaddr
+        readbuf = self._message(i + 1, addr, I2C_M_RD, n)
+        self._pending = 0
+        self._transfer(i + 2)
+        ctypes.memmove((ctypes.c_char * n).from_buffer(buf), readbuf, n)
+
+
+    def readfrom_mem(self, addr, memaddr, nbytes, addrsize=8):
+        buf = bytearray(nbytes)
+        self.readfrom_mem_into(addr, memaddr, buf)
+        return bytes(buf)
+
+
+class Loopback:
+    # An ioctl stand-in that carries out I2C_RDWR messages on a bus
+    # object with the machine.I2C calls, such as si5351sim.SimI2C:
+    #
+    #     bus = SimI2C()
+    #     si = SI5351_I2C(LinuxI2C(fd=-1, ioctl=Loopback(bus)))
+
+    def __init__(self, bus):
+        self.bus   = bus
+        self.calls = 0
+
+
+    def __call__(self, fd, request, data):
+        if request != I2C_RDWR:
+            raise OSError(22)   # EINVAL
+        self.calls += 1
+        memaddr = None
+        for i in range(data.nmsgs):
+            msg = data.msgs[i]
+            if msg.flags & I2C_M_RD:
+                buf = bytearray(msg.len)
+                self.bus.readfrom_mem_into(msg.addr, memaddr, buf)
+                ctypes.memmove(msg.buf, bytes(buf), msg.len)
+            elif msg.len == 1:
+                memaddr = msg.buf[0]    # register address of a read
+            else:
+                self.bus.writeto_mem(msg.addr, msg.buf[0], bytes(msg.buf[1:msg.len]))
+        return 0
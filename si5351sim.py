@@ -0,0 +1,172 @@
+
+# Host side stand-in for machine.I2C with a simulated SI5351 on it.
+#
+# It models the register file with address auto-increment, the
+# self-clearing PLL reset register and the device status register,
+# and records every transaction with its size and wire time, so the
+# driver can be tested and benchmarked on CPython:
+#
+#     bus = SimI2C(freq=100000)
+#     si = SI5351_I2C(bus)
+#     ...
+#     print(bus.summary(), bus.frequency(0))
+
+from fractions import Fraction
+
+SI5351_REGISTER_0_DEVICE_STATUS = 0
+SI5351_REGISTER_177_PLL_RESET   = 177
+
+SI5351_STATUS_SYS_INIT = (1<<7)
+SI5351_STATUS_LOL_B    = (1<<6)
+SI5351_STATUS_LOL_A    = (1<<5)
+SI5351_STATUS_LOS      = (1<<4)
+SI5351_STATUS_LOS_XTAL = (1<<3)
+
+
+class SimI2C:
+
+    def __init__(self, address=0x60, freq=100000,
+                 crystalFreq=25000000, lockTime=0):
+        # freq is the bus clock used to estimate wire time and
+        # lockTime how long (us of bus time) a PLL takes to lock after
+        # it is reset
+        self.address     = address
+        self.freq        = freq
+        self.crystalFreq = crystalFreq
+        self.lockTime    = lockTime
+        self.regs        = bytearray(256)
+        self.resets      = [0, 0]       # PLL A and PLL B reset counts
+        self.now         = 0.0          # bus time in us
+        self._locked     = [0.0, 0.0]   # bus time each PLL locks at
+        self.xtalLost    = False        # set to simulate a dead crystal
+        self.clear()
+
+
+    def clear(self):
+        # forget the recorded transactions
+        self.log = []
+
+
+    def _account(self, kind, register, nbytes, nwire):
+        # nwire bytes on the wire at 9 clocks each, plus start and stop
+        us = (nwire * 9 + 2) * 1e6 / self.freq
+        self.now += us
+        self.log.append((kind, register, nbytes, us))
+
+
+    def _check(self, addr):
+        if addr != self.address:
+            raise OSError(19)   # ENODEV, as machine.I2C on a missing device
+
+
+    def writeto_mem(self, addr, memaddr, buf, addrsize=8):
+        self._check(addr)
+        self._account("w", memaddr, len(buf), 2 + len(buf))
+        for i in range(len(buf)):
+            self._write(memaddr + i, buf[i])
+
+
+    def writeto(self, addr, buf, stop=True):
+        self._check(addr)
+        self._account("w", buf[0], len(buf) - 1, 1 + len(buf))
+        for i in range(1, len(buf)):
+            self._write(buf[0] + i - 1, buf[i])
+        return len(buf)
+
+
+    def readfrom_mem(self, addr, memaddr, nbytes, addrsize=8):
+        buf = bytearray(nbytes)
+        self.readfrom_mem_into(addr, memaddr, buf)
+        return bytes(buf)
+
+
+    def readfrom_mem_into(self, addr, memaddr, buf, addrsize=8):
+        self._check(addr)
+        # register write, repeated start, address and the data read back
+        self._account("r", memaddr, len(buf), 3 + len(buf))
+        for i in range(len(buf)):
+            buf[i] = self._read(memaddr + i)
+
+
+    def _write(self, register, value):
+        register &= 0xFF
+        if register == SI5351_REGISTER_0_DEVICE_STATUS:
+            return
+        if register == SI5351_REGISTER_177_PLL_RESET:
+            # self-clearing: bit 5 resets PLL A, bit 7 resets PLL B
+            for pll, bit in ((0, 1<<5), (1, 1<<7)):
+                if value & bit:
+                    self.resets[pll] += 1
+                    self._locked[pll] = self.now + self.lockTime
+            value &= ~((1<<7) | (1<<5))
+        self.regs[register] = value
+
+
+    def _read(self, register):
+        register &= 0xFF
+        if register == SI5351_REGISTER_0_DEVICE_STATUS:
+            status = self.regs[register] & 0x03
+            if self.now < self._locked[0]: status |= SI5351_STATUS_LOL_A
+            if self.now < self._locked[1]: status |= SI5351_STATUS_LOL_B
+            if self.xtalLost: status |= SI5351_STATUS_LOS_XTAL | SI5351_STATUS_LOL_A | SI5351_STATUS_LOL_B
+            return status
+        return self.regs[register]
+
+
+    def power_cycle(self):
+        # lose the register contents as after a supply glitch
+        for i in range(len(self.regs)):
+            self.regs[i] = 0
+
+
+    def summary(self):
+        # totals over the recorded transactions
+        written = sum(n for kind, r, n, us in self.log if kind == "w")
+        read = sum(n for kind, r, n, us in self.log if kind == "r")
+        return {
+            "transactions": len(self.log),
+            "bytes_written": written,
+            "bytes_read": read,
+            "us": sum(us for kind, r, n, us in self.log),
+        }
+
+
+    def divider(self, baseaddr):
+        # the divider a + b / c held by a parameter block as a Fraction,
+        # since 128 * (a + b / c) = P1 + 512 + P2 / P3
+        r = self.regs[baseaddr:baseaddr + 8]
+        P3 = (r[5] & 0xF0) << 12 | r[0] << 8 | r[1]
+        P1 = (r[2] & 0x03) << 16 | r[3] << 8 | r[4]
+        P2 = (r[5] & 0x0F) << 16 | r[6] << 8 | r[7]
+        if P3 == 0:
+            return None
+        return (P1 + 512 + Fraction(P2, P3)) / 128
+
+
+    def vco(self, pll):
+        # the VCO frequency of PLL A (0) or B (1) as a Fraction
+        mult = self.divider(26 if pll == 0 else 34)
+        return mult and self.crystalFreq * mult
+
+
+    def frequency(self, output):
+        # the frequency the registers program on an output as a
+        # Fraction, or None if the output is powered down or not driven
+        # by its multisynth; the output enable register is not applied
+        ctrl = self.regs[16 + output]
+        if ctrl & 0x80 or ctrl & 0x0C != 0x0C:
+            return None
+        fvco = self.vco((ctrl >> 5) & 1)
+        baseaddr = 42 + 8 * output
+        if self.regs[baseaddr + 2] & 0x0C == 0x0C:
+            ms = 4                   # MSx_DIVBY4
+        else:
+            ms = self.divider(baseaddr)
+        if not fvco or not ms:
+            return None
+        return fvco / ms / (1 << ((self.regs[baseaddr + 2] >> 4) & 0x07))
+
+
+    def enabled(self, output):
+        # whether the output enable register lets the output through
+        return not self.regs[3] & (1 << output)
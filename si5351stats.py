@@ -0,0 +1,134 @@
+
+# Opt-in instrumentation for SI5351_I2C, see SI5351_I2C.instrument().
+#
+# Nothing in the driver itself is counted or timed.  Enabling the
+# instrumentation puts a counting proxy in front of the I2C bus and
+# shadows the public methods of the instance with timing wrappers, and
+# disabling it takes both away again, so an uninstrumented driver runs
+# exactly the code it always did.
+
+from si5351 import ticks_us, ticks_diff
+
+
+# the methods timed, from the planning and divider math up to whole calls
+TIMED = ("setupPLL", "setupMultisynth", "setupRdiv", "enableOutputs",
+         "retune_pll", "set_freq", "set_freqs", "set_vco", "load_image",
+         "wait_lock", "resync", "_tuning", "_flush")
+
+
+class CountingI2C:
+    # Stand-in for the bus that counts transactions and bytes and hands
+    # every register write to the trace hooks as
+    # hook(ticks_us, register, data) before passing it on.
+
+    def __init__(self, i2c, counters, hooks):
+        self.i2c      = i2c
+        self.counters = counters
+        self.hooks    = hooks
+
+
+    def writeto_mem(self, addr, memaddr, buf, *args, **kw):
+        c = self.counters
+        c["transactions"] += 1
+        c["bytes_written"] += len(buf)
+        if self.hooks:
+            now = ticks_us()
+            for hook in self.hooks:
+                hook(now, memaddr, buf)
+        try:
+            return self.i2c.writeto_mem(addr, memaddr, buf, *args, **kw)
+        except OSError:
+            c["errors"] += 1
+            raise
+
+
+    def readfrom_mem(self, addr, memaddr, nbytes, *args, **kw):
+        c = self.counters
+        c["transactions"] += 1
+        c["bytes_read"] += nbytes
+        try:
+            return self.i2c.readfrom_mem(addr, memaddr, nbytes, *args, **kw)
+        except OSError:
+            c["errors"] += 1
+            raise
+
+
+    def readfrom_mem_into(self, addr, memaddr, buf, *args, **kw):
+        c = self.counters
+        c["transactions"] += 1
+        c["bytes_read"] += len(buf)
+        try:
+            return self.i2c.readfrom_mem_into(addr, memaddr, buf, *args, **kw)
+        except OSError:
+            c["errors"] += 1
+            raise
+
+
+class Instrumentation:
+
+    def __init__(self, si):
+        self.si       = si
+        self.hooks    = []
+        self.counters = {}
+        self.methods  = {}
+        self.reset()
+
+
+    def reset(self):
+        for key in ("transactions", "bytes_written", "bytes_read", "errors",
+                    "cache_hits", "cache_misses"):
+            self.counters[key] = 0
+        for entry in self.methods.values():
+            entry[0] = entry[1] = entry[2] = 0
+
+
+    def enable(self):
+        si = self.si
+        self._i2c = si.i2c
+        si.i2c = CountingI2C(si.i2c, self.counters, self.hooks)
+        for name in TIMED:
+            entry = self.methods.setdefault(name, [0, 0, 0])  # calls, total us, max us
+            setattr(si, name, self._timed(getattr(si, name), entry))
+        si.set_freq = self._cached(si.set_freq)
+
+
+    def disable(self):
+        si = self.si
+        si.i2c = self._i2c
+        for name in TIMED:
+            delattr(si, name)
+
+
+    def _timed(self, method, entry):
+        def timed(*args, **kw):
+            start = ticks_us()
+            try:
+                return method(*args, **kw)
+            finally:
+                us = ticks_diff(ticks_us(), start)
+                entry[0] += 1
+                entry[1] += us
+                if us > entry[2]: entry[2] = us
+        return timed
+
+
+    def _cached(self, method):
+        # count tuning cache hits, looking before set_freq does
+        si, counters = self.si, self.counters
+        def set_freq(output, pll, freq):
+            if freq in si._tune[pll]:
+                counters["cache_hits"] += 1
+            else:
+                counters["cache_misses"] += 1
+            return method(output, pll, freq)
+        return set_freq
+
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats["methods"] = {
+            name: {"calls": calls, "total_us": total, "max_us": most,
+                   "mean_us": total / calls}
+            for name, (calls, total, most) in self.methods.items() if calls
+        }
+        return stats
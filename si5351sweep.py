@@ -0,0 +1,223 @@
+
+# Frequency sweep engine for SI5351_I2C, see SI5351_I2C.sweep().
+#
+# The steps are compiled one ahead into the few register bytes that
+# differ from the previous step, so playing a step back is only a
+# short burst write.  Compiling the next step happens in the dwell time
+# after the current one went out, so memory stays bounded however long
+# the sweep is.  Playback runs from a busy-waiting loop (run), an
+# asyncio task (arun) or a machine.Timer callback (start), all three
+# provided by Player, which the keyer in si5351keying plays from too.
+
+from si5351 import ticks_us, ticks_add, ticks_diff, sleep_us
+from si5351 import rDivider, SI5351_BURST_GAP
+from si5351 import SI5351_REGISTER_16_CLK0_CONTROL, SI5351_REGISTER_42_MULTISYNTH0_PARAMETERS_1
+
+
+def frange(start, stop, step):
+    # frequencies from start up to and including stop (down if step < 0)
+    freq = start
+    while (freq <= stop) if step > 0 else (freq >= stop):
+        yield freq
+        freq += step
+
+
+def delta(register, old, new):
+    # the (register, bytes) bursts that turn old into new, joining
+    # runs separated by at most SI5351_BURST_GAP equal bytes
+    runs = []
+    i, n = 0, len(new)
+    while i < n:
+        if old is not None and old[i] == new[i]:
+            i += 1
+            continue
+        start = end = i
+        i += 1
+        while i < n and i - end <= SI5351_BURST_GAP + 1:
+            if old is None or old[i] != new[i]: end = i
+            i += 1
+        runs.append((register + start, bytes(new[start:end + 1])))
+        i = end + 1
+    return runs
+
+
+class Player:
+    # Writes steps at fixed edges, period_us apart, and records how
+    # late each went out.  Subclasses provide _more(), whether a step
+    # is left, and _step(index, late), which writes step index.
+
+    def _play(self, late):
+        self.played += 1
+        self.late_max_us = max(self.late_max_us, abs(late))
+        self._late_sum += abs(late)
+        self._step(self._index, late)
+        self._index += 1
+
+
+    def _run(self, period_us):
+        # busy-wait for every edge, sleeping through most of long ones
+        start = ticks_us()
+        self._start = start
+        while self._more():
+            deadline = ticks_add(start, self._index * period_us)
+            wait = ticks_diff(deadline, ticks_us())
+            if wait > 2000:
+                sleep_us(wait - 1000)
+            while ticks_diff(deadline, ticks_us()) > 0:
+                pass
+            self._play(ticks_diff(ticks_us(), deadline))
+        self._end = ticks_us()
+        return self.stats()
+
+
+    async def _arun(self, period_us):
+        # sleep between edges so other asyncio tasks run
+        try:
+            import uasyncio as asyncio
+        except ImportError:
+            import asyncio
+        start = ticks_us()
+        self._start = start
+        while self._more():
+            deadline = ticks_add(start, self._index * period_us)
+            wait = ticks_diff(deadline, ticks_us())
+            if wait > 0:
+                await asyncio.sleep(wait / 1e6)
+            self._play(ticks_diff(ticks_us(), deadline))
+        self._end = ticks_us()
+        return self.stats()
+
+
+    def _startTimer(self, timer, period_us):
+        # one step per timer period, period_us rounded to whole ms; the
+        # first step goes out at once
+        from machine import Timer
+        self._period = max(1, (period_us + 500) // 1000)
+        self._start = ticks_us()
+        if self._more():
+            self._play(0)
+        timer.init(mode=Timer.PERIODIC, period=self._period, callback=self._tick_ref)
+
+
+    def _tick(self, timer):
+        if not self._more():
+            timer.deinit()
+            self._end = ticks_us()
+            return
+        deadline = ticks_add(self._start, self._index * self._period * 1000)
+        self._play(ticks_diff(ticks_us(), deadline))
+
+
+    def done(self):
+        return not self._more()
+
+
+    def reset_stats(self):
+        self.played = 0
+        self.late_max_us = 0
+        self._late_sum = 0
+        self._start = self._end = None
+
+
+    def _elapsed(self):
+        if self._start is None:
+            return 0
+        return ticks_diff(self._end if self._end is not None else ticks_us(), self._start)
+
+
+    def _lateMean(self):
+        return self._late_sum / self.played if self.played else 0
+
+
+class Sweep(Player):
+
+    def __init__(self, si, output, pll, freqs, dwell_us=1000, callback=None):
+        # callback(index, freq, achieved) runs right after each step is
+        # written, for example to sample a detector.  A step the
+        # multisynth cannot reach from the VCO raises ValueError when it
+        # is compiled, the step before it is played.
+        self.si       = si
+        self.output   = output
+        self.pll      = pll
+        self.dwell_us = dwell_us
+        self.callback = callback
+        self._freqs   = iter(freqs)
+        self._block   = None
+        self._ctrl    = None
+        self._spare   = bytearray(8), bytearray(1)
+        self._next    = self._compile()
+        self._index   = 0
+        self._tick_ref = self._tick
+        self.reset_stats()
+
+
+    def _compile(self):
+        # the next step as (freq, achieved, bursts), None when done
+        try:
+            freq = next(self._freqs)
+        except StopIteration:
+            return None
+        # the multisynth has to divide the VCO by 8 to 900, set_freq
+        # would steer the PLL or raise instead
+        si = self.si
+        fvco = si.plla_freq if self.pll == si.PLL_A else si.pllb_freq
+        f = rDivider(freq)[1]
+        if not 8 * f <= fvco <= 900 * f:
+            raise ValueError("step {} out of range".format(freq))
+        # the step is packed into the buffers of the one before last,
+        # the previous one is kept to work out the delta against
+        block, ctrl = self._spare
+        achieved = si._tuning(self.pll, freq, block, ctrl)
+        runs = delta(SI5351_REGISTER_42_MULTISYNTH0_PARAMETERS_1 + 8 * self.output,
+                     self._block, block)
+        runs += delta(SI5351_REGISTER_16_CLK0_CONTROL + self.output, self._ctrl, ctrl)
+        if self._block is not None:
+            self._spare = self._block, self._ctrl
+        else:
+            self._spare = bytearray(8), bytearray(1)
+        self._block, self._ctrl = block, ctrl
+        return freq, achieved, runs
+
+
+    def _more(self):
+        return self._next is not None
+
+
+    def _step(self, index, late):
+        # write the compiled step and compile the following one
+        freq, achieved, runs = self._next
+        for register, data in runs:
+            self.si._write(register, data)
+        if self.callback:
+            self.callback(index, freq, achieved)
+        self._next = self._compile()
+
+
+    def run(self):
+        # Play the sweep back, busy-waiting for every step edge.
+        # Returns stats().
+        return self._run(self.dwell_us)
+
+
+    async def arun(self):
+        # Play the sweep back from an asyncio task, sleeping between
+        # steps so other tasks run.  Returns stats().
+        return await self._arun(self.dwell_us)
+
+
+    def start(self, timer):
+        # Play the sweep back from a machine.Timer, one step per
+        # period (dwell_us rounded to whole ms).  The first step goes
+        # out at once.  done() tells when it is over.
+        self._startTimer(timer, self.dwell_us)
+
+
+    def stats(self):
+        # steps written, steps per second and how late steps went out
+        elapsed = self._elapsed()
+        return {
+            "steps": self.played,
+            "steps_per_s": self.played * 1e6 / elapsed if elapsed else 0,
+            "jitter_max_us": self.late_max_us,
+            "jitter_mean_us": self._lateMean(),
+        }
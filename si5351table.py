@@ -0,0 +1,164 @@
+
+# Offline channel table compiler for SI5351_I2C.open_table, CPython
+# with NumPy only.
+#
+# For fixed channel plans of many thousands of channels the divider
+# math of set_freq is done once on the host for the whole frequency
+# array at a time, and the resulting register images are written to a
+# table file the device reads one record at a time.  The math is that
+# of rDivider, divider/bestFraction, packParameters and clockControl in
+# si5351.py, vectorized, so a table record holds exactly the registers
+# set_freq would write.
+#
+#     python3 si5351table.py 7000000 7300000 10 -o 40m.tbl
+#
+# The table is a SI5351_TABLE_HEADER (magic, pll, PLL multiplier num
+# and denom, crystal frequency, channel count) followed by one 9 byte
+# record per channel: the 8 multisynth parameter registers and the clk
+# control register.
+
+import struct
+import sys
+
+import numpy as np
+
+from si5351 import SI5351_I2C, SI5351_CRYSTAL_FREQ_25MHZ, SI5351_CLKOUT_MIN_FREQ, vcoFraction
+from si5351 import SI5351_MULTISYNTH_C_MAX, SI5351_TABLE_MAGIC, SI5351_TABLE_HEADER
+from si5351 import SI5351_TABLE_HEADER_SIZE, SI5351_TABLE_RECORD_SIZE
+
+
+def best_fraction(num, denom, maxDenom=SI5351_MULTISYNTH_C_MAX):
+    # bestFraction over arrays: the continued fraction expansion runs
+    # for all elements at once, each stopping when its next convergent
+    # would exceed maxDenom or the expansion ends.
+    # Object arrays of Python ints are kept as they are, for inputs
+    # whose products would overflow int64.
+    num, denom = np.asarray(num), np.asarray(denom)
+    if num.dtype != object:
+        num, denom = num.astype(np.int64), denom.astype(np.int64)
+    p0, q0 = np.zeros_like(num), np.ones_like(num)
+    p1, q1 = np.ones_like(num), np.zeros_like(num)
+    n, d = num.copy(), denom.copy()
+    active = denom > maxDenom
+    exact = ~active
+    while active.any():
+        a = np.where(active, n // np.where(d == 0, 1, d), 0)
+        q2 = q0 + a * q1
+        step = active & (q2 <= maxDenom)
+        active &= step
+        p0, q0, p1, q1 = (np.where(step, p1, p0), np.where(step, q1, q0),
+                          np.where(step, p0 + a * p1, p1), np.where(step, q2, q1))
+        n, d = np.where(step, d, n), np.where(step, n - a * d, d)
+        ended = step & (d == 0)
+        exact |= ended
+        active &= ~ended
+
+    # the largest semiconvergent, where closer than the last convergent
+    k = (maxDenom - q0) // np.where(q1 == 0, 1, q1)
+    p2, q2 = p0 + k * p1, q0 + k * q1
+    semi = (~exact & (np.abs(p2 * denom - num * q2) * q1 <
+                      np.abs(p1 * denom - num * q1) * q2))
+    p = np.where(exact & (denom <= maxDenom), num, np.where(semi, p2, p1))
+    q = np.where(exact & (denom <= maxDenom), denom, np.where(semi, q2, q1))
+    return p, q
+
+
+def r_divider(freqs):
+    # rDivider over an array, returning the R divider and scaled frequency
+    freqs = np.asarray(freqs, dtype=np.int64)
+    r_div = np.zeros_like(freqs)
+    for k in range(7):
+        band = ((freqs >= SI5351_CLKOUT_MIN_FREQ << k) &
+                (freqs < SI5351_CLKOUT_MIN_FREQ << (k + 1)))
+        r_div[band] = SI5351_I2C.R_DIV_128 - k
+    return r_div, freqs << r_div
+
+
+def pack_parameters(a, b, c, rdiv):
+    # packParameters over arrays, returning an (n, 8) uint8 array
+    t  = (b << 7) // c
+    P1 = (a << 7) + t - 512
+    P2 = (b << 7) - c * t
+    P3 = c
+    return np.stack([
+        (P3 & 0x0000FF00) >> 8,
+        (P3 & 0x000000FF),
+        ((rdiv & 0x07) << 4) | ((P1 & 0x00030000) >> 16),
+        (P1 & 0x0000FF00) >> 8,
+        (P1 & 0x000000FF),
+        ((P3 & 0x000F0000) >> 12) | ((P2 & 0x000F0000) >> 16),
+        (P2 & 0x0000FF00) >> 8,
+        (P2 & 0x000000FF),
+    ], axis=1)
+
+
+def compile_table(freqs, pll=SI5351_I2C.PLL_A, mult=32, num=0, denom=1,
+                  crystalFreq=SI5351_CRYSTAL_FREQ_25MHZ):
+    # Work out the set_freq registers of every frequency in freqs for
+    # the PLL at crystalFreq * (mult + num / denom).  Returns the
+    # (n, 9) uint8 records, the achieved frequencies and their error.
+    # Raises ValueError for channels above fVCO / 8, which set_freq
+    # does not reach through the multisynth.
+    freqs = np.asarray(freqs, dtype=np.int64)
+    n, d = vcoFraction(crystalFreq, mult, num, denom)
+    r_div, scaled = r_divider(freqs)
+    if np.any(freqs << 3 > n // d):
+        raise ValueError("channels above fVCO / 8, set_freq steers the PLL for those")
+
+    # fit the divider against the exact VCO n / d as _tuning does.
+    # best_fraction multiplies the denominator by up to 2**20, the
+    # largest fraction denominator, so once that could overflow int64
+    # the math is done in Python ints instead.
+    if d * int(scaled.max(initial=0)) < 1 << 42:
+        den = scaled * d
+    else:
+        den = scaled.astype(object) * d
+    a = n // den
+    b, c = best_fraction(n % den, den)
+    carry = b == c
+    a, b, c = a + carry, np.where(carry, 0, b), np.where(carry, 1, c)
+    ctrl = np.full(len(freqs), 0x0F, dtype=np.uint8)
+    if pll == SI5351_I2C.PLL_B:
+        ctrl |= (1 << 5)
+    ctrl[b == 0] |= (1 << 6)
+    records = np.hstack([pack_parameters(a, b, c, r_div).astype(np.uint8), ctrl[:, None]])
+    # achieved frequencies by exact integer division, as in _tuning
+    a, b, c, r_div = (x.astype(object) for x in (a, b, c, r_div))
+    achieved = (n * c / (d * (a * c + b) << r_div)).astype(np.float64)
+    return records, achieved, achieved - freqs
+
+
+def write_table(f, records, pll=SI5351_I2C.PLL_A, mult=32, num=0, denom=1,
+                crystalFreq=SI5351_CRYSTAL_FREQ_25MHZ):
+    f.write(struct.pack(SI5351_TABLE_HEADER, SI5351_TABLE_MAGIC, pll, mult,
+                        num, denom, crystalFreq, len(records)))
+    f.write(np.ascontiguousarray(records, dtype=np.uint8).tobytes())
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Compile a SI5351 channel table")
+    parser.add_argument("start", type=int, help="first channel in Hz")
+    parser.add_argument("stop", type=int, help="last channel in Hz")
+    parser.add_argument("step", type=int, help="channel spacing in Hz")
+    parser.add_argument("-o", "--output", required=True, help="table file to write")
+    parser.add_argument("--pll", type=int, default=SI5351_I2C.PLL_A)
+    parser.add_argument("--mult", type=int, default=32)
+    parser.add_argument("--num", type=int, default=0)
+    parser.add_argument("--denom", type=int, default=1)
+    parser.add_argument("--crystal", type=int, default=SI5351_CRYSTAL_FREQ_25MHZ)
+    args = parser.parse_args(argv)
+
+    freqs = np.arange(args.start, args.stop + 1, args.step, dtype=np.int64)
+    records, achieved, error = compile_table(freqs, args.pll, args.mult, args.num,
+                                             args.denom, args.crystal)
+    with open(args.output, "wb") as f:
+        write_table(f, records, args.pll, args.mult, args.num, args.denom, args.crystal)
+    worst = np.argmax(np.abs(error))
+    size = SI5351_TABLE_HEADER_SIZE + len(records) * SI5351_TABLE_RECORD_SIZE
+    print("{} channels, {} bytes, worst error {:.6f} Hz at {} Hz, mean {:.6f} Hz".format(
+        len(freqs), size, error[worst], freqs[worst], np.abs(error).mean()))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,28 @@
+
+# The driver modules sit at the top of the repository, as they are
+# copied onto the device; make them importable from the tests.
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from si5351 import SI5351_I2C
+from si5351sim import SimI2C
+
+
+@pytest.fixture
+def bus():
+    return SimI2C()
+
+
+@pytest.fixture
+def si(bus):
+    # a driver with PLL A at 800MHz and PLL B at 700MHz, log cleared
+    si = SI5351_I2C(bus)
+    si.setupPLL(si.PLL_A, 32)
+    si.setupPLL(si.PLL_B, 28)
+    bus.clear()
+    return si
@@ -0,0 +1,121 @@
+
+# Register output of the keyer, the sweep engine and the quadrature
+# pair on the simulated bus.
+
+from fractions import Fraction
+
+import pytest
+
+from si5351 import SI5351_REGISTER_165_CLK0_PHASE_OFFSET
+
+
+def test_keyer_tones(si, bus):
+    keyer = si.keyer(0, si.PLL_A, 10140100, (375, 256), 4)
+    for symbol in (0, 3, 1, 2):
+        bus.clear()
+        keyer.key(symbol)
+        assert [kind for kind, register, n, us in bus.log] == ["w"]
+        achieved = bus.frequency(0)
+        assert float(achieved) == keyer.achieved[symbol]
+        # within a step of the 20 bit multisynth fraction, about 0.1Hz here
+        assert abs(achieved - 10140100 - Fraction(375, 256) * symbol) < Fraction(1, 10)
+
+
+def test_keyer_restages_after_set_freq(si, bus):
+    keyer = si.keyer(0, si.PLL_A, 7040100, 2, 4)
+    si.set_freq(0, si.PLL_A, 7000000)
+    keyer.key(1)
+    assert float(bus.frequency(0)) == keyer.achieved[1]
+    bus.clear()
+    keyer.key(3)
+    assert len(bus.log) == 1
+    assert float(bus.frequency(0)) == keyer.achieved[3]
+
+
+def test_keyer_send(si, bus):
+    keyer = si.keyer(0, si.PLL_A, 14097100, (375, 256), 4)
+    stats = keyer.send([1, 0, 2, 3], 100)
+    assert stats["symbols"] == 4
+    assert keyer.done()
+    assert float(bus.frequency(0)) == keyer.achieved[3]
+
+
+def test_sweep_steps(si, bus):
+    seen = []
+
+    def callback(index, freq, achieved):
+        seen.append((index, freq, achieved, float(bus.frequency(0))))
+
+    stats = si.sweep(0, si.PLL_A, 7000000, 7000500, 100, dwell_us=10, callback=callback).run()
+    assert stats["steps"] == 6
+    assert [freq for index, freq, achieved, actual in seen] == list(range(7000000, 7000600, 100))
+    for index, freq, achieved, actual in seen:
+        assert achieved == actual
+        assert abs(achieved - freq) < 0.01
+
+
+def test_sweep_rejects_steps_out_of_range(si, bus):
+    with pytest.raises(ValueError):
+        si.sweep(0, si.PLL_A, [150000000]).run()
+    sweep = si.sweep(0, si.PLL_A, [7000000, 150000000])
+    with pytest.raises(ValueError):
+        sweep.run()
+    assert bus.frequency(0) == 7000000
+
+
+def phases(bus, outputs=(0, 1)):
+    return [bus.regs[SI5351_REGISTER_165_CLK0_PHASE_OFFSET + output] for output in outputs]
+
+
+def test_quadrature_pair(si, bus):
+    iq = si.quadrature()
+    achieved = iq.set_freq(7074000)
+    assert bus.frequency(0) == bus.frequency(1)
+    assert float(bus.frequency(0)) == achieved
+    assert phases(bus) == [0, iq.div]
+    assert bus.regs[16] & (1 << 6) and bus.regs[17] & (1 << 6)
+
+    # a step within the divider only moves the PLL
+    bus.clear()
+    iq.set_freq(7075000)
+    assert all(26 <= register < 34 for kind, register, n, us in bus.log if kind == "w")
+    assert bus.frequency(0) == bus.frequency(1) == 7075000
+
+
+def test_quadrature_recovers_from_other_writes(si, bus):
+    iq = si.quadrature()
+    iq.set_freq(7074000)
+    si.set_freqs([10000000, 20000000])
+    assert iq.set_freq(7074000) == 7074000
+    assert bus.frequency(0) == bus.frequency(1) == 7074000
+    assert phases(bus) == [0, iq.div]
+
+
+def test_quadrature_steps(si, bus):
+    iq = si.quadrature()
+    freqs = [14000000 + 1000 * k for k in range(5)]
+    achieved = iq.compile(freqs)
+    for index in (2, 0, 4):
+        iq.step(index)
+        assert bus.frequency(0) == bus.frequency(1)
+        assert float(bus.frequency(0)) == pytest.approx(achieved[index], rel=1e-12)
+    si.set_freq(1, si.PLL_B, 5000000)
+    iq.step(3)
+    assert float(bus.frequency(1)) == pytest.approx(achieved[3], rel=1e-12)
+    assert phases(bus) == [0, iq.div]
+
+
+def test_table_matches_set_freq(si, bus, tmp_path):
+    np = pytest.importorskip("numpy")
+    from si5351table import compile_table, write_table
+    freqs = [137000, 1838000, 7074000, 10136000, 28074000, 99000000]
+    records, achieved, error = compile_table(freqs, mult=32, num=1, denom=3)
+    path = tmp_path / "band.tbl"
+    with open(path, "wb") as f:
+        write_table(f, records, mult=32, num=1, denom=3)
+    with open(path, "rb") as f:
+        table = si.open_table(f)
+        for index, freq in enumerate(freqs):
+            table.tune(index)
+            assert float(bus.frequency(0)) == achieved[index]
+            assert si.set_freq(0, si.PLL_A, freq) == achieved[index]
@@ -0,0 +1,119 @@
+
+# Register shadow, transactions and PLL resets against the simulated bus.
+
+import pytest
+
+from si5351 import SI5351_BURST_GAP
+
+
+def writes(bus):
+    # (register, count) of every write on the bus
+    return [(register, n) for kind, register, n, us in bus.log if kind == "w"]
+
+
+def test_unchanged_bytes_are_not_written(si, bus):
+    si.set_freq(0, si.PLL_A, 7000000)
+    bus.clear()
+    si.set_freq(0, si.PLL_A, 7000000)
+    assert bus.log == []
+
+
+def test_bursts_join_over_a_short_gap(si, bus):
+    si.writeBlock(100, bytes(8))
+    bus.clear()
+    with si.transaction():
+        si.write8(100, 1)
+        si.write8(101 + SI5351_BURST_GAP, 1)
+    assert writes(bus) == [(100, SI5351_BURST_GAP + 2)]
+
+    bus.clear()
+    with si.transaction():
+        si.write8(100, 2)
+        si.write8(102 + SI5351_BURST_GAP, 2)
+    assert writes(bus) == [(100, 1), (102 + SI5351_BURST_GAP, 1)]
+
+
+def test_bursts_never_resend_unknown_bytes(si, bus):
+    # registers 110..112 were never written, so 111 is unknown
+    with si.transaction():
+        si.write8(110, 1)
+        si.write8(112, 1)
+    assert writes(bus) == [(110, 1), (112, 1)]
+
+
+def test_invalidate_writes_everything_again(si, bus):
+    si.set_freq(0, si.PLL_A, 7000000)
+    si.invalidate()
+    bus.clear()
+    si.set_freq(0, si.PLL_A, 7000000)
+    assert writes(bus) == [(16, 1), (42, 8)]
+
+
+def test_transaction_holds_writes_until_commit(si, bus):
+    si.begin()
+    si.setupPLL(si.PLL_A, 36)
+    si.set_freq(0, si.PLL_A, 10000000)
+    si.enableOutputs(True)
+    assert bus.log == []
+    si.commit()
+    order = [register for register, n in writes(bus)]
+    # configuration in ascending bursts, then the PLL reset, then the enables
+    assert order[-2:] == [177, 3]
+    assert order[:-2] == sorted(order[:-2])
+    assert order.count(177) == 1
+    assert bus.frequency(0) == 10000000
+
+
+def test_commit_disables_outputs_first(si, bus):
+    si.set_freq(0, si.PLL_A, 10000000)
+    si.enableOutputs(True)
+    bus.clear()
+    with si.transaction():
+        si.set_freq(0, si.PLL_A, 11000000)
+        si.enableOutputs(False)
+    assert writes(bus)[0] == (3, 1)
+    assert bus.regs[3] == 0xFF
+
+
+def test_abort_drops_the_writes(si, bus):
+    si.set_freq(0, si.PLL_A, 7000000)
+    bus.clear()
+    si.begin()
+    si.setupPLL(si.PLL_A, 36)
+    si.set_freq(0, si.PLL_A, 10000000)
+    si.abort()
+    assert bus.log == []
+    assert si.plla_freq == 800000000
+    # what was staged is unknown now, so it all goes out again
+    si.set_freq(0, si.PLL_A, 7000000)
+    assert bus.frequency(0) == 7000000
+
+
+def test_unbalanced_commit_and_abort_raise(si):
+    with pytest.raises(RuntimeError):
+        si.commit()
+    with pytest.raises(RuntimeError):
+        si.abort()
+    with si.transaction():
+        pass
+
+
+def test_raw_writes_wait_for_commit(si, bus):
+    keyer = si.keyer(0, si.PLL_A, 10140100, (375, 256), 4)
+    bus.clear()
+    with si.transaction():
+        keyer.key(2)
+        assert bus.log == []
+    assert float(bus.frequency(0)) == keyer.achieved[2]
+
+
+def test_retune_pll_resets_only_on_a_new_integer_part(si, bus):
+    si.retune_pll(si.PLL_A, 32, 1, 2)
+    assert bus.resets == [2, 2]
+    assert writes(bus)[-1][0] != 177
+    si.retune_pll(si.PLL_A, 33)
+    assert bus.resets == [3, 2]
+    si.retune_pll(si.PLL_B, 29)
+    assert bus.resets == [3, 3]
+    assert bus.vco(0) == 33 * 25000000
+    assert bus.vco(1) == 29 * 25000000
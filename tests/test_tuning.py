@@ -0,0 +1,131 @@
+
+# Frequencies set_freq, the PLL steering and the planner put on the
+# simulated outputs, and register images.
+
+import random
+
+import pytest
+
+from si5351 import SI5351_I2C, SI5351_IMAGE_RANGES, planFrequencies
+from si5351sim import SimI2C
+
+
+@pytest.mark.parametrize("freq", [8000, 100000, 1000000, 7074000, 14000123, 99999999])
+def test_set_freq_achieves_what_it_reports(si, bus, freq):
+    achieved = si.set_freq(0, si.PLL_A, freq)
+    assert float(bus.frequency(0)) == achieved
+    # within one step of the 20 bit multisynth fraction
+    assert abs(achieved - freq) <= freq * 1e-7
+
+
+def test_set_freq_on_a_fractional_pll(si, bus):
+    si.setupPLL(si.PLL_B, 28, 123457, 1048575)
+    for freq in (3500000, 7000001, 50000000):
+        assert si.set_freq(1, si.PLL_B, freq) == float(bus.frequency(1))
+
+
+def test_cache_misses_reuse_the_evicted_buffers(bus):
+    si = SI5351_I2C(bus, cacheSize=4)
+    si.setupPLL(si.PLL_A, 32)
+    for freq in range(7000000, 7000080, 10):
+        assert si.set_freq(0, si.PLL_A, freq) == float(bus.frequency(0))
+    assert len(si._tune[si.PLL_A]) == 4
+
+
+def test_steering_moves_the_pll_behind_an_integer_divider(si, bus):
+    for freq in (120000000, 120001000, 180000000, 199999999, 101000000):
+        achieved = si.set_freq(0, si.PLL_A, freq)
+        assert float(bus.frequency(0)) == achieved
+        # within one step of the 20 bit PLL fraction, divided down
+        assert abs(achieved - freq) <= 25000000 / 1048575
+        assert bus.regs[16] & (1 << 6)      # integer mode
+
+
+def test_steering_step_writes_only_the_pll(si, bus):
+    si.set_freq(0, si.PLL_A, 120000000)
+    bus.clear()
+    si.set_freq(0, si.PLL_A, 120000100)
+    assert all(26 <= register < 34 for kind, register, n, us in bus.log)
+
+
+def test_steering_refuses_a_shared_pll(si, bus):
+    si.set_freq(1, si.PLL_A, 10000000)
+    with pytest.raises(ValueError):
+        si.set_freq(0, si.PLL_A, 120000000)
+    assert bus.frequency(1) == 10000000
+
+
+def test_steering_stops_at_200mhz(si):
+    si.set_freq(0, si.PLL_A, 160000000)
+    with pytest.raises(ValueError):
+        si.set_freq(0, si.PLL_A, 220000000)
+
+
+def test_steering_after_other_writes(si, bus):
+    si.set_freq(0, si.PLL_A, 120000000)
+    si.set_freqs([7000000])
+    assert si.set_freq(0, si.PLL_A, 121000000) == 121000000
+    assert bus.frequency(0) == 121000000
+
+
+def test_plans_are_valid():
+    rng = random.Random(1)
+    # below 900MHz / 8 any set of frequencies has a plan
+    for i in range(40):
+        freqs = [rng.randrange(10000, 112500000) for n in range(rng.randrange(1, 4))]
+        bus = SimI2C()
+        si = SI5351_I2C(bus)
+        achieved = si.set_freqs(freqs)
+        for output, freq in enumerate(freqs):
+            assert float(bus.frequency(output)) == pytest.approx(achieved[output], rel=1e-12)
+            assert abs(achieved[output] - freq) < 1
+        vco, outputs = planFrequencies(freqs)
+        for pll in (0, 1):
+            if vco[pll]:
+                assert 600000000 <= bus.vco(pll) <= 900000000
+        for pll, div, num, denom, r_div in outputs:
+            # even integer dividers run in integer mode down to 6
+            assert div in (4, 6) and num == 0 or 8 <= div + num / denom <= 900
+            assert denom <= 1048575
+
+
+def test_image_round_trip(si, bus):
+    si.set_freq(0, si.PLL_A, 7000000)
+    si.set_freq(2, si.PLL_B, 14000000)
+    si.enableOutputs(True)
+    image = si.export_image()
+
+    copy = SimI2C()
+    loaded = SI5351_I2C(copy, image=image)
+    assert copy.frequency(0) == bus.frequency(0)
+    assert copy.frequency(2) == bus.frequency(2)
+    assert copy.regs[3] == bus.regs[3]
+    assert loaded.export_image() == image
+    for kind, register, n, us in copy.log:
+        if kind == "w" and register != 177:
+            assert any(start <= register and register + n <= stop
+                       for start, stop in SI5351_IMAGE_RANGES)
+
+
+def test_image_is_complete_after_invalidate_and_abort(si, bus):
+    si.set_freq(0, si.PLL_A, 7000000)
+    image = si.export_image()
+    si.invalidate()
+    assert si.export_image() == image
+    si.begin()
+    si.setupPLL(si.PLL_A, 33, 1, 7)
+    si.abort()
+    assert si.export_image() == image
+
+
+@pytest.mark.parametrize("image", [
+    b"S5" + bytes([26, 4]) + bytes(4),          # part of the PLL A block
+    b"S5" + bytes([3, 5, 0]),                   # truncated
+    b"S5" + bytes([100, 1, 0]),                 # reserved register
+    b"XX",
+])
+def test_bad_images_are_rejected(image):
+    bus = SimI2C()
+    with pytest.raises(ValueError):
+        SI5351_I2C(bus, image=image)
+    assert bus.log == []